@@ -0,0 +1,89 @@
+import asyncio
+import logging
+from datetime import datetime, timezone, timedelta
+
+logger = logging.getLogger(__name__)
+
+# Matches documents without a deleted_at flag (missing or null)
+NOT_DELETED = {"deleted_at": None}
+
+ARCHIVED_COLLECTIONS = ("carros", "clientes", "funcionarios", "vendas")
+
+
+def archive_name(collection: str) -> str:
+    return f"{collection}_archive"
+
+
+def soft_delete_update() -> dict:
+    return {"$set": {"deleted_at": datetime.now(timezone.utc).isoformat()}}
+
+
+async def find_with_archive(db, collection: str, query: dict, projection: dict, limit: int, incluir_arquivados: bool = False):
+    docs = await db[collection].find(query, projection).to_list(limit)
+    if incluir_arquivados and len(docs) < limit:
+        docs += await db[archive_name(collection)].find(query, projection).to_list(limit - len(docs))
+    return docs
+
+
+async def _move(db, collection: str, docs: list):
+    # Upsert into the archive first so an interrupted run never loses documents
+    if not docs:
+        return 0
+    from pymongo import ReplaceOne
+
+    archived_at = datetime.now(timezone.utc).isoformat()
+    ops = [ReplaceOne({"_id": d["_id"]}, {**d, "archived_at": archived_at}, upsert=True) for d in docs]
+    await db[archive_name(collection)].bulk_write(ops, ordered=False)
+    result = await db[collection].delete_many({"_id": {"$in": [d["_id"] for d in docs]}})
+    return result.deleted_count
+
+
+async def archive_old_vendas(db, months: int, batch_size: int = 500) -> dict:
+    """Move vendas older than ``months`` and the sold carros they reference to the archive collections."""
+    cutoff = (datetime.now(timezone.utc) - timedelta(days=30 * months)).isoformat()
+    moved = {"vendas": 0, "carros": 0}
+    while True:
+        # Soft-deleted vendas are left to archive_soft_deleted
+        vendas = await db.vendas.find({"data_venda": {"$lt": cutoff}, **NOT_DELETED}).limit(batch_size).to_list(batch_size)
+        if not vendas:
+            break
+        carro_ids = {v["carro_id"] for v in vendas}
+        # A carro resold after the cutoff stays hot with its current venda
+        recent = await db.vendas.find(
+            {"carro_id": {"$in": list(carro_ids)}, "data_venda": {"$gte": cutoff}, **NOT_DELETED},
+            {"_id": 0, "carro_id": 1},
+        ).to_list(None)
+        carro_ids -= {v["carro_id"] for v in recent}
+        carros = await db.carros.find({"id": {"$in": list(carro_ids)}, "status": "vendido"}).to_list(len(carro_ids))
+        moved["carros"] += await _move(db, "carros", carros)
+        moved["vendas"] += await _move(db, "vendas", vendas)
+        await asyncio.sleep(0)
+    return moved
+
+
+async def archive_soft_deleted(db, retention_days: int, batch_size: int = 500) -> dict:
+    """Move documents soft-deleted more than ``retention_days`` ago out of the hot collections."""
+    cutoff = (datetime.now(timezone.utc) - timedelta(days=retention_days)).isoformat()
+    moved = {}
+    for collection in ARCHIVED_COLLECTIONS:
+        moved[collection] = 0
+        while True:
+            docs = await db[collection].find({"deleted_at": {"$ne": None, "$lt": cutoff}}).limit(batch_size).to_list(batch_size)
+            if not docs:
+                break
+            moved[collection] += await _move(db, collection, docs)
+            await asyncio.sleep(0)
+    return moved
+
+
+async def run_archiver(db, months: int, retention_days: int, interval_seconds: float, batch_size: int = 500):
+    while True:
+        try:
+            vendas = await archive_old_vendas(db, months, batch_size)
+            deleted = await archive_soft_deleted(db, retention_days, batch_size)
+            logger.info("Arquivamento concluído: %s, excluídos: %s", vendas, deleted)
+        except asyncio.CancelledError:
+            raise
+        except Exception:
+            logger.exception("Falha no arquivamento")
+        await asyncio.sleep(interval_seconds)
@@ -0,0 +1,105 @@
+import asyncio
+import logging
+import uuid
+from datetime import datetime, timezone
+from typing import Optional
+
+logger = logging.getLogger(__name__)
+
+AUDIT_COLLECTION = "audit"
+OVERFLOW_POLICIES = ("drop_newest", "drop_oldest", "block")
+
+
+class AuditLog:
+    """Write-behind audit trail.
+
+    Handlers enqueue events on an in-memory bounded queue and return; a
+    background task flushes them to the ``audit`` collection with batched
+    ``insert_many`` calls. When the queue is full, ``overflow`` decides
+    whether the new event is dropped, the oldest one is dropped, or the
+    caller waits for room.
+    """
+
+    def __init__(self, max_queue: int = 10_000, batch_size: int = 500,
+                 flush_interval: float = 1.0, overflow: str = "drop_oldest"):
+        if overflow not in OVERFLOW_POLICIES:
+            raise ValueError(f"overflow must be one of {OVERFLOW_POLICIES}")
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self.overflow = overflow
+        self._queue: asyncio.Queue = asyncio.Queue(maxsize=max_queue)
+        self._db = None
+        self._task: Optional[asyncio.Task] = None
+        self._closing = False
+        self.metrics = {"enfileirados": 0, "gravados": 0, "descartados": 0, "falhas": 0}
+
+    async def record(self, actor: Optional[dict], action: str, entity: str, entity_id: Optional[str], changes: Optional[dict] = None):
+        event = {
+            "id": str(uuid.uuid4()),
+            "timestamp": datetime.now(timezone.utc).isoformat(),
+            "actor_id": actor.get("id") if actor else None,
+            "actor_email": actor.get("email") if actor else None,
+            "action": action,
+            "entity": entity,
+            "entity_id": entity_id,
+            "changes": {k: v for k, v in (changes or {}).items() if k != "senha"},
+        }
+        if self.overflow == "block":
+            await self._queue.put(event)
+        else:
+            try:
+                self._queue.put_nowait(event)
+            except asyncio.QueueFull:
+                self.metrics["descartados"] += 1
+                if self.overflow == "drop_newest":
+                    return
+                self._queue.get_nowait()
+                self._queue.put_nowait(event)
+        self.metrics["enfileirados"] += 1
+
+    def start(self, db):
+        self._db = db
+        self._closing = False
+        self._task = asyncio.create_task(self._run())
+
+    async def stop(self):
+        # Let the writer finish its current batch, then flush whatever is
+        # still queued before the database client closes
+        self._closing = True
+        if self._task:
+            await self._task
+            self._task = None
+        while not self._queue.empty():
+            await self._flush(self._drain())
+
+    def _drain(self) -> list:
+        batch = []
+        while len(batch) < self.batch_size and not self._queue.empty():
+            batch.append(self._queue.get_nowait())
+        return batch
+
+    async def _run(self):
+        while not self._closing:
+            try:
+                first = await asyncio.wait_for(self._queue.get(), timeout=self.flush_interval)
+            except asyncio.TimeoutError:
+                continue
+            # Give concurrent handlers a moment to add to the batch
+            await asyncio.sleep(0)
+            await self._flush([first] + self._drain())
+
+    async def _flush(self, batch: list):
+        if not batch:
+            return
+        try:
+            await self._db[AUDIT_COLLECTION].insert_many(batch, ordered=False)
+            self.metrics["gravados"] += len(batch)
+        except Exception:
+            self.metrics["falhas"] += len(batch)
+            logger.exception("Falha ao gravar %d eventos de auditoria", len(batch))
+
+
+async def create_audit_indexes(db):
+    await db[AUDIT_COLLECTION].create_index([("timestamp", -1)])
+    await db[AUDIT_COLLECTION].create_index([("actor_id", 1), ("timestamp", -1)])
+    await db[AUDIT_COLLECTION].create_index([("entity", 1), ("entity_id", 1), ("timestamp", -1)])
@@ -0,0 +1,96 @@
+#!/usr/bin/env python3
+"""Per-handler micro-benchmarks against the in-process app (see harness.py).
+
+Each endpoint is called sequentially to measure latency, then with
+``--concurrency`` simultaneous requests to measure throughput. Runs on
+mongomock by default, so numbers show FastAPI/Pydantic/handler overhead
+rather than MongoDB; pass --mongo-url for a real (throwaway) mongod.
+The concurrent GET figures include request coalescing on the list routes.
+
+    cd backend && python benchmarks/handlers.py --requests 200 --concurrency 20
+"""
+import argparse
+import asyncio
+import statistics
+import sys
+import time
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from harness import LOGIN, in_process_client  # noqa: E402
+
+NOVO_CARRO = {"modelo": "SUV", "marca": "Toyota", "cor": "Branco", "preco": 85000.0, "portas": 4}
+
+
+def scenarios(ids: dict) -> dict:
+    return {
+        "GET /auth/me": ("GET", "/auth/me", None),
+        "GET /carros": ("GET", "/carros", None),
+        "GET /clientes": ("GET", "/clientes", None),
+        "GET /funcionarios": ("GET", "/funcionarios", None),
+        "GET /vendas": ("GET", "/vendas", None),
+        "GET /dashboard/stats": ("GET", "/dashboard/stats", None),
+        "GET /clientes/search": ("GET", "/clientes/search?q=ana@", None),
+        "GET /vendas/ranking": ("GET", "/vendas/ranking?periodo=total", None),
+        "GET /carros/precos/stats": ("GET", "/carros/precos/stats", None),
+        "GET /vendas/export": ("GET", "/vendas/export", None),
+        "POST /carros": ("POST", "/carros", NOVO_CARRO),
+        "PUT /carros/{id}": ("PUT", f"/carros/{ids['carro']}", {"preco": 90000.0}),
+        "POST /auth/login (bcrypt)": ("POST", "/auth/login", LOGIN),
+    }
+
+
+async def measure(client, method, url, body, requests, concurrency):
+    latencies = []
+    for _ in range(requests):
+        start = time.perf_counter()
+        response = await client.request(method, url, json=body)
+        latencies.append((time.perf_counter() - start) * 1000)
+        response.raise_for_status()
+
+    async def worker(count):
+        for _ in range(count):
+            (await client.request(method, url, json=body)).raise_for_status()
+
+    start = time.perf_counter()
+    per_worker = max(1, requests // concurrency)
+    await asyncio.gather(*(worker(per_worker) for _ in range(concurrency)))
+    throughput = per_worker * concurrency / (time.perf_counter() - start)
+
+    latencies.sort()
+    return {
+        "p50": statistics.median(latencies),
+        "p95": latencies[int(len(latencies) * 0.95) - 1] if len(latencies) > 1 else latencies[0],
+        "rps": throughput,
+    }
+
+
+async def run(args):
+    async with in_process_client(mongo_url=args.mongo_url) as client:
+        carros = (await client.get("/carros")).json()
+        ids = {"carro": carros[0]["id"]}
+        selected = scenarios(ids)
+        if args.only:
+            selected = {name: s for name, s in selected.items() if any(o in name for o in args.only)}
+
+        print(f"{'handler':<28} {'p50 ms':>8} {'p95 ms':>8} {'req/s':>9}")
+        for name, (method, url, body) in selected.items():
+            # bcrypt dominates login; keep its sample small
+            requests = min(args.requests, 10) if "bcrypt" in name else args.requests
+            result = await measure(client, method, url, body, requests, args.concurrency)
+            print(f"{name:<28} {result['p50']:8.2f} {result['p95']:8.2f} {result['rps']:9.0f}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--requests", type=int, default=100, help="requests per handler")
+    parser.add_argument("--concurrency", type=int, default=10)
+    parser.add_argument("--mongo-url", help="use a real (throwaway) MongoDB instead of mongomock")
+    parser.add_argument("--only", nargs="*", help="substrings of handler names to run")
+    args = parser.parse_args()
+    asyncio.run(run(args))
+
+
+if __name__ == "__main__":
+    main()
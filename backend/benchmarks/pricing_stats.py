@@ -0,0 +1,150 @@
+#!/usr/bin/env python3
+"""Benchmark for the inventory price statistics (GET /api/carros/precos/stats).
+
+By default builds 1M synthetic cars in memory and compares the NumPy
+computation in pricing.py against a plain-Python group-by. With --mongo it
+also loads the cars and --vendas sales into a scratch database
+(<DB_NAME>_bench, dropped at the end), creates the production indexes, and
+times the batched column load and the vendas -> carros discount join through
+Motor. --without-id-index skips the carros.id index to show what the join
+costs without it.
+
+    cd backend && python benchmarks/pricing_stats.py --cars 1000000 [--mongo] [--vendas 250000]
+"""
+import argparse
+import asyncio
+import statistics
+import sys
+import time
+from collections import defaultdict
+from pathlib import Path
+
+import numpy as np
+
+BACKEND_DIR = Path(__file__).resolve().parent.parent
+sys.path.insert(0, str(BACKEND_DIR))
+
+from integrity import create_integrity_indexes  # noqa: E402
+from pricing import GROUP_FIELDS, load_carro_columns, load_discount_columns, price_statistics  # noqa: E402
+
+MODELOS = ["Coupe", "Compacto", "SUV", "Esportivo"]
+MARCAS = ["Ford", "GMC", "Toyota", "Volkswagen"]
+CORES = ["Vermelho", "Preto", "Branco", "Cinza"]
+
+
+def synthetic_columns(n: int, seed: int = 42) -> dict:
+    """Columns in the dictionary-encoded layout returned by load_carro_columns."""
+    rng = np.random.default_rng(seed)
+    labels = {"marca": MARCAS, "modelo": MODELOS, "cor": CORES, "portas": ["2", "4"]}
+    columns = {field: rng.integers(0, len(values), n, dtype=np.int32) for field, values in labels.items()}
+    columns["preco"] = rng.uniform(40_000, 250_000, n).round(2)
+    columns["labels"] = labels
+    return columns
+
+
+def label(columns: dict, field: str, i: int):
+    return columns["labels"][field][columns[field][i]]
+
+
+def python_statistics(rows: list) -> dict:
+    def summarize(values):
+        values = sorted(values)
+        q = statistics.quantiles(values, n=100, method="inclusive")
+        return {"quantidade": len(values), "minimo": values[0], "maximo": values[-1],
+                "media": statistics.fmean(values), "mediana": statistics.median(values),
+                "p10": q[9], "p25": q[24], "p75": q[74], "p90": q[89]}
+
+    result = {"geral": summarize([r["preco"] for r in rows])}
+    for field in GROUP_FIELDS:
+        groups = defaultdict(list)
+        for r in rows:
+            groups[r[field]].append(r["preco"])
+        result[f"por_{field}"] = {key: summarize(values) for key, values in groups.items()}
+    return result
+
+
+def timed(fn, *args):
+    start = time.perf_counter()
+    result = fn(*args)
+    return result, (time.perf_counter() - start) * 1000
+
+
+async def mongo_load(columns: dict, n: int, vendas: int, batch_size: int, id_index: bool = True) -> dict:
+    import os
+    from dotenv import load_dotenv
+    from motor.motor_asyncio import AsyncIOMotorClient
+
+    load_dotenv(BACKEND_DIR / ".env")
+    client = AsyncIOMotorClient(os.environ["MONGO_URL"])
+    db = client[os.environ["DB_NAME"] + "_bench"]
+    await client.drop_database(db.name)
+    print(f"inserting {n:,} cars into {db.name}.carros ...")
+    for start in range(0, n, 50_000):
+        end = min(start + 50_000, n)
+        await db.carros.insert_many([
+            {"id": str(i), "preco": float(columns["preco"][i]), "status": "disponível",
+             **{field: label(columns, field, i) for field in GROUP_FIELDS if field != "portas"},
+             "portas": int(label(columns, "portas", i))}
+            for i in range(start, end)
+        ])
+    print(f"inserting {vendas:,} vendas into {db.name}.vendas ...")
+    rng = np.random.default_rng(7)
+    sold = rng.choice(n, size=min(vendas, n), replace=False)
+    for start in range(0, sold.size, 50_000):
+        await db.vendas.insert_many([
+            {"id": f"v{i}", "carro_id": str(i), "valor_venda": float(columns["preco"][i]) * 0.95}
+            for i in sold[start:start + 50_000].tolist()
+        ])
+    await db.carros.create_index("status")
+    if id_index:
+        await create_integrity_indexes(db)
+
+    timings = {}
+    start = time.perf_counter()
+    loaded = await load_carro_columns(db, {"status": "disponível"}, batch_size=batch_size)
+    timings["load"] = (time.perf_counter() - start) * 1000
+    assert loaded["preco"].size == n
+
+    start = time.perf_counter()
+    precos, _ = await load_discount_columns(db, {}, batch_size=batch_size)
+    timings["discount"] = (time.perf_counter() - start) * 1000
+    assert precos.size == sold.size
+
+    await client.drop_database(db.name)
+    client.close()
+    return timings
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--cars", type=int, default=1_000_000)
+    parser.add_argument("--batch-size", type=int, default=10_000)
+    parser.add_argument("--skip-python", action="store_true", help="skip the plain-Python baseline")
+    parser.add_argument("--mongo", action="store_true", help="also time loading from MongoDB (MONGO_URL)")
+    parser.add_argument("--vendas", type=int, default=250_000, help="sales to insert for the discount join (--mongo)")
+    parser.add_argument("--without-id-index", action="store_true", help="do not index carros.id (--mongo)")
+    args = parser.parse_args()
+
+    columns = synthetic_columns(args.cars)
+    stats, numpy_ms = timed(price_statistics, columns)
+    print(f"cars                 : {args.cars:,}")
+    print(f"numpy statistics     : {numpy_ms:8.1f} ms")
+
+    if not args.skip_python:
+        rows = [
+            {"preco": float(columns["preco"][i]), **{field: label(columns, field, i) for field in GROUP_FIELDS}}
+            for i in range(args.cars)
+        ]
+        baseline, python_ms = timed(python_statistics, rows)
+        assert abs(baseline["geral"]["mediana"] - stats["geral"]["mediana"]) < 1e-6
+        print(f"plain-python baseline: {python_ms:8.1f} ms ({python_ms / numpy_ms:.1f}x slower)")
+
+    if args.mongo:
+        timings = asyncio.run(mongo_load(columns, args.cars, args.vendas, args.batch_size, not args.without_id_index))
+        print(f"mongo column load    : {timings['load']:8.1f} ms (batch_size={args.batch_size})")
+        index = "without" if args.without_id_index else "with"
+        print(f"mongo discount join  : {timings['discount']:8.1f} ms ({args.vendas:,} vendas, {index} carros.id index)")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,79 @@
+#!/usr/bin/env python3
+"""Cold-start benchmark for the backend process.
+
+Measures wall time of fresh interpreters importing ``server`` (module import,
+model/route build and ``create_app()``) and prints the slowest imports as
+reported by ``python -X importtime``.
+
+    cd backend && python benchmarks/startup.py --runs 10
+"""
+import argparse
+import os
+import statistics
+import subprocess
+import sys
+import time
+from pathlib import Path
+
+BACKEND_DIR = Path(__file__).resolve().parent.parent
+
+
+def time_command(code: str, runs: int) -> list:
+    timings = []
+    for _ in range(runs):
+        start = time.perf_counter()
+        subprocess.run([sys.executable, "-c", code], cwd=BACKEND_DIR, check=True)
+        timings.append((time.perf_counter() - start) * 1000)
+    return timings
+
+
+def import_breakdown(module: str) -> dict:
+    """Cumulative import time (ms) of each module imported directly by ``module``, from -X importtime."""
+    result = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", f"import {module}"],
+        cwd=BACKEND_DIR, check=True, capture_output=True, text=True,
+    )
+    children = {}
+    pending = {}
+    for line in result.stderr.splitlines():
+        if not line.startswith("import time:") or "cumulative" in line:
+            continue
+        prefix, cumulative_us, name = line.split("|")
+        self_us = prefix.split(":")[1]
+        # importtime prints children before their parent, indented two spaces per level
+        depth = (len(name) - len(name.lstrip()) - 1) // 2
+        name = name.strip()
+        if depth == 1:
+            pending[name] = int(cumulative_us) / 1000
+        elif depth == 0:
+            if name == module:
+                children = pending
+                children[f"{module} (self)"] = int(self_us) / 1000
+            pending = {}
+    return children
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--runs", type=int, default=10)
+    parser.add_argument("--top", type=int, default=15)
+    args = parser.parse_args()
+
+    # Keep the import path free of side effects such as the archiver or a real Mongo connection
+    os.environ.setdefault("ARCHIVE_ENABLED", "false")
+
+    baseline = time_command("pass", args.runs)
+    server = time_command("import server", args.runs)
+    print(f"interpreter only : median {statistics.median(baseline):7.1f} ms")
+    print(f"import server    : median {statistics.median(server):7.1f} ms "
+          f"(min {min(server):.1f}, max {max(server):.1f}, {args.runs} runs)")
+    print(f"server overhead  : median {statistics.median(server) - statistics.median(baseline):7.1f} ms")
+
+    print("\nImports pulled in by server (-X importtime, cumulative ms):")
+    breakdown = sorted(import_breakdown("server").items(), key=lambda item: item[1], reverse=True)
+    for name, ms in breakdown[: args.top]:
+        print(f"  {name:<28} {ms:8.1f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,84 @@
+import asyncio
+from collections import defaultdict
+from typing import Dict, Iterable, Tuple
+
+
+class CoalescingMetrics:
+    def __init__(self):
+        self.executed = defaultdict(int)
+        self.coalesced = defaultdict(int)
+
+    def snapshot(self) -> dict:
+        paths = set(self.executed) | set(self.coalesced)
+        return {
+            path: {"executados": self.executed[path], "agrupados": self.coalesced[path]}
+            for path in sorted(paths)
+        }
+
+
+class SingleFlightMiddleware:
+    """Merge identical in-flight GET requests into a single execution.
+
+    Requests are identical when they share path, query string and
+    Authorization header. The first one runs the app; the others wait for
+    it and receive a copy of the same status, headers and body bytes.
+    """
+
+    def __init__(self, app, paths: Iterable[str], metrics: CoalescingMetrics):
+        self.app = app
+        self.paths = frozenset(paths)
+        self.metrics = metrics
+        self._inflight: Dict[Tuple, asyncio.Future] = {}
+
+    def _key(self, scope):
+        if scope["type"] != "http" or scope["method"] != "GET" or scope["path"] not in self.paths:
+            return None
+        authorization = b""
+        for name, value in scope["headers"]:
+            if name == b"x-profile":
+                return None
+            if name == b"authorization":
+                authorization = value
+        return scope["path"], scope["query_string"], authorization
+
+    async def __call__(self, scope, receive, send):
+        key = self._key(scope)
+        if key is None:
+            await self.app(scope, receive, send)
+            return
+
+        leader = self._inflight.get(key)
+        if leader is not None:
+            messages = await asyncio.shield(leader)
+            if messages is None:
+                # The leader failed; run independently so its error is not shared
+                await self.app(scope, receive, send)
+                return
+            self.metrics.coalesced[scope["path"]] += 1
+            for message in messages:
+                await send(_copy(message))
+            return
+
+        future = asyncio.get_running_loop().create_future()
+        self._inflight[key] = future
+        messages = []
+
+        async def capture(message):
+            messages.append(_copy(message))
+            await send(message)
+
+        try:
+            await self.app(scope, receive, capture)
+        finally:
+            del self._inflight[key]
+            complete = bool(messages) and messages[-1]["type"] == "http.response.body" and not messages[-1].get("more_body")
+            future.set_result(messages if complete else None)
+            self.metrics.executed[scope["path"]] += 1
+
+
+def _copy(message):
+    # Outer middleware (e.g. CORS) mutates the header list in place. A leader
+    # picked by profiling sampling must not hand its profile id to followers
+    if "headers" in message:
+        return {**message, "headers": [(k, v) for k, v in message["headers"] if k != b"x-profile-id"]}
+    return dict(message)
@@ -0,0 +1,124 @@
+import os
+from collections import Counter, defaultdict
+
+READ_PREFERENCES = ("primary", "primaryPreferred", "secondary", "secondaryPreferred", "nearest")
+# Smallest maxStalenessSeconds MongoDB accepts (heartbeat frequency plus idle write period)
+MIN_MAX_STALENESS = 90
+
+
+class LazyDatabase:
+    """Motor database handle that creates its client on first use.
+
+    Importing motor/pymongo and building the client is deferred so that
+    importing the app (worker boot, test collection) stays cheap. The
+    lifespan hook calls ``connect()``/``close()`` explicitly; scripts that
+    skip the lifespan still get a connection on first attribute access.
+
+    Attribute access always goes to the primary. Reporting and list reads
+    ask ``for_reads(route)`` instead, which returns a handle on the
+    separate reporting deployment (``read_url_env``) if one is configured,
+    otherwise the same database with ``read_preference`` and
+    ``max_staleness`` applied. Each decision is counted per route in
+    ``read_routing``.
+    """
+
+    def __init__(self, url_env: str = "MONGO_URL", name_env: str = "DB_NAME",
+                 read_url_env: str = "MONGO_READ_URL", read_name_env: str = "MONGO_READ_DB_NAME",
+                 read_preference: str = "primary", max_staleness: int = -1):
+        if read_preference not in READ_PREFERENCES:
+            raise ValueError(f"read_preference must be one of {READ_PREFERENCES}")
+        # pymongo only rejects these at server selection, i.e. on every routed read
+        if max_staleness != -1 and max_staleness < MIN_MAX_STALENESS:
+            raise ValueError(f"max_staleness must be -1 or at least {MIN_MAX_STALENESS} seconds")
+        if max_staleness != -1 and read_preference == "primary":
+            raise ValueError("max_staleness cannot be combined with read_preference 'primary'")
+        self.url_env = url_env
+        self.name_env = name_env
+        self.read_url_env = read_url_env
+        self.read_name_env = read_name_env
+        self.read_preference = read_preference
+        # Seconds; -1 means no limit
+        self.max_staleness = max_staleness
+        self.client = None
+        self.read_client = None
+        self._db = None
+        self._read_db = None
+        self._reporting_in_use = False
+        self._routes = defaultdict(Counter)
+
+    def connect(self):
+        if self._db is None:
+            from motor.motor_asyncio import AsyncIOMotorClient
+
+            self.client = AsyncIOMotorClient(os.environ[self.url_env])
+            self._db = self.client[os.environ[self.name_env]]
+        return self._db
+
+    def use(self, database, reporting=None):
+        """Point the handle at an existing database object (tests, benchmarks)."""
+        self.client = None
+        self.read_client = None
+        self._db = database
+        self._read_db = reporting
+        self._reporting_in_use = reporting is not None
+
+    def close(self):
+        if self.client is not None:
+            self.client.close()
+        if self.read_client is not None:
+            self.read_client.close()
+        self.client = None
+        self.read_client = None
+        self._db = None
+        self._read_db = None
+        self._reporting_in_use = False
+
+    @property
+    def read_target(self) -> str:
+        if self._reporting_in_use or os.environ.get(self.read_url_env):
+            return "relatorios"
+        if self.read_preference != "primary":
+            return "secundario"
+        return "primario"
+
+    def for_reads(self, route: str):
+        """Database handle for a reporting or list read; staleness up to ``max_staleness`` is acceptable."""
+        target = self.read_target
+        self._routes[route][target] += 1
+        if target == "primario":
+            return self.connect()
+        if self._read_db is None:
+            self._read_db = self._connect_reads(target)
+        return self._read_db
+
+    def _connect_reads(self, target: str):
+        from pymongo.read_preferences import make_read_preference, read_pref_mode_from_name
+
+        # max_staleness is only valid with a non-primary mode
+        mode = read_pref_mode_from_name(self.read_preference)
+        if target == "secundario":
+            preference = make_read_preference(mode, None, self.max_staleness)
+            return self.connect().with_options(read_preference=preference)
+
+        from motor.motor_asyncio import AsyncIOMotorClient
+
+        options = {"readPreference": self.read_preference}
+        if mode and self.max_staleness != -1:
+            options["maxStalenessSeconds"] = self.max_staleness
+        self.read_client = AsyncIOMotorClient(os.environ[self.read_url_env], **options)
+        return self.read_client[os.environ.get(self.read_name_env) or os.environ[self.name_env]]
+
+    @property
+    def read_routing(self) -> dict:
+        return {
+            "destino": self.read_target,
+            "read_preference": self.read_preference,
+            "max_staleness_s": self.max_staleness,
+            "rotas": {route: dict(counts) for route, counts in self._routes.items()},
+        }
+
+    def __getattr__(self, name):
+        return getattr(self.connect(), name)
+
+    def __getitem__(self, name):
+        return self.connect()[name]
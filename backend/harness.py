@@ -0,0 +1,120 @@
+"""In-process harness: the FastAPI app behind httpx's ASGITransport with a local MongoDB stand-in.
+
+No network and no deployed server: requests go straight into the ASGI app,
+and the database is mongomock-motor (in memory) unless a MongoDB URL is
+given, e.g. a throwaway ``mongod --dbpath $(mktemp -d) --port 27018``.
+``local_replica_set()`` starts a throwaway two-member replica set so read
+routing to secondaries can be exercised too.
+"""
+import asyncio
+import os
+import shutil
+import subprocess
+import tempfile
+import uuid
+from contextlib import asynccontextmanager
+from typing import Optional
+
+# Harness defaults, applied before server reads its configuration
+os.environ.setdefault("ARCHIVE_ENABLED", "false")
+os.environ.setdefault("INTEGRITY_SCAN_ENABLED", "false")
+for _name in ("LOGIN_RATE_LIMIT_IP_BURST", "LOGIN_RATE_LIMIT_USER_BURST", "HEAVY_RATE_LIMIT_USER_BURST"):
+    os.environ.setdefault(_name, "100000")
+
+LOGIN = {"email": "joao@carroamarelo.com", "senha": "senha123"}
+
+
+def stand_in_database(mongo_url: Optional[str] = None):
+    if mongo_url:
+        from motor.motor_asyncio import AsyncIOMotorClient
+
+        return AsyncIOMotorClient(mongo_url)[f"harness_{uuid.uuid4().hex[:8]}"]
+    try:
+        from mongomock_motor import AsyncMongoMockClient
+    except ImportError:
+        raise SystemExit("mongomock-motor não instalado: pip install mongomock-motor, ou informe --mongo-url")
+    return AsyncMongoMockClient()["harness"]
+
+
+@asynccontextmanager
+async def local_replica_set(port: int = 27018, name: str = "harness"):
+    """Start a primary plus a secondary (priority 0) on ``port`` and ``port + 1``; yield the connection URL."""
+    from motor.motor_asyncio import AsyncIOMotorClient
+
+    if not shutil.which("mongod"):
+        raise SystemExit("mongod não encontrado no PATH")
+    dbpath = tempfile.mkdtemp(prefix="harness-rs-")
+    members = [port, port + 1]
+    processes = []
+    try:
+        for member in members:
+            path = os.path.join(dbpath, str(member))
+            os.makedirs(path)
+            processes.append(subprocess.Popen(
+                ["mongod", "--replSet", name, "--port", str(member), "--dbpath", path, "--bind_ip", "127.0.0.1"],
+                stdout=subprocess.DEVNULL,
+            ))
+
+        admin = AsyncIOMotorClient(f"mongodb://127.0.0.1:{port}", directConnection=True).admin
+        await _wait_for(lambda: admin.command("ping"))
+        await admin.command("replSetInitiate", {"_id": name, "members": [
+            {"_id": 0, "host": f"127.0.0.1:{port}", "priority": 2},
+            {"_id": 1, "host": f"127.0.0.1:{port + 1}", "priority": 0},
+        ]})
+
+        async def ready():
+            states = [m["stateStr"] for m in (await admin.command("replSetGetStatus"))["members"]]
+            if states != ["PRIMARY", "SECONDARY"]:
+                raise RuntimeError(f"replica set ainda não pronto: {states}")
+
+        await _wait_for(ready)
+        admin.client.close()
+        # w=majority waits for the secondary, so scenario reads routed there see the preceding writes
+        yield f"mongodb://127.0.0.1:{port},127.0.0.1:{port + 1}/?replicaSet={name}&w=majority"
+    finally:
+        for process in processes:
+            process.terminate()
+            process.wait()
+        shutil.rmtree(dbpath, ignore_errors=True)
+
+
+async def _wait_for(check, timeout: float = 30.0):
+    deadline = asyncio.get_running_loop().time() + timeout
+    while True:
+        try:
+            return await check()
+        except Exception:
+            if asyncio.get_running_loop().time() > deadline:
+                raise
+            await asyncio.sleep(0.25)
+
+
+@asynccontextmanager
+async def in_process_client(mongo_url: Optional[str] = None, seed: bool = True, read_preference: Optional[str] = None):
+    """Yield an authenticated httpx.AsyncClient bound to the app, with a seeded stand-in database.
+
+    ``read_preference`` overrides READ_PREFERENCE for the routed reporting/list reads.
+    """
+    import httpx
+
+    import server
+    from seed_data import seed_database
+
+    database = stand_in_database(mongo_url)
+    if read_preference:
+        server.db.read_preference = read_preference
+    server.db.use(database)
+    if seed:
+        await seed_database(database)
+
+    async with server.app.router.lifespan_context(server.app):
+        transport = httpx.ASGITransport(app=server.app)
+        async with httpx.AsyncClient(transport=transport, base_url="http://harness/api", timeout=None) as client:
+            response = await client.post("/auth/login", json=LOGIN)
+            response.raise_for_status()
+            client.headers["Authorization"] = f"Bearer {response.json()['token']}"
+            try:
+                yield client
+            finally:
+                if mongo_url:
+                    await database.client.drop_database(database.name)
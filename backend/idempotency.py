@@ -0,0 +1,165 @@
+import asyncio
+import hashlib
+import json
+import uuid
+from datetime import datetime, timedelta, timezone
+from typing import Iterable
+
+IDEMPOTENCY_COLLECTION = "idempotency"
+IDEMPOTENCY_HEADER = b"idempotency-key"
+
+# Responses that say nothing definitive about the operation; a retry should run again
+NOT_CACHED_STATUS = {401, 409, 429}
+
+
+async def create_idempotency_indexes(db, ttl_seconds: int):
+    await db[IDEMPOTENCY_COLLECTION].create_index("created_at", expireAfterSeconds=ttl_seconds)
+
+
+class IdempotencyMiddleware:
+    """Replay the stored response for POST retries carrying the same Idempotency-Key.
+
+    The first request with a key claims it in the ``idempotency`` collection
+    (TTL-indexed) with a fingerprint of method, path and body, runs the
+    handler and stores the response. Retries get that response back without
+    running the handler; duplicates that arrive while the first is still
+    running wait for it. Reusing a key for a different request is a 422.
+
+    A claim holds a lease of ``lease_seconds``; if the handler never finishes
+    (worker killed mid-request), a retry after the lease expires takes the
+    key over instead of getting 409 until the TTL removes it. The lease must
+    outlast the slowest create handler.
+    """
+
+    def __init__(self, app, db, paths: Iterable[str], wait_timeout: float = 10.0, lease_seconds: float = 60.0):
+        self.app = app
+        self.db = db
+        self.paths = frozenset(paths)
+        self.wait_timeout = wait_timeout
+        self.lease_seconds = lease_seconds
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http" or scope["method"] != "POST" or scope["path"] not in self.paths:
+            await self.app(scope, receive, send)
+            return
+        headers = dict(scope["headers"])
+        key = headers.get(IDEMPOTENCY_HEADER)
+        if not key:
+            await self.app(scope, receive, send)
+            return
+
+        body = await _read_body(receive)
+        # Keys are scoped to the caller's credentials
+        scoped_key = hashlib.sha256(headers.get(b"authorization", b"") + b"\0" + key).hexdigest()
+        fingerprint = hashlib.sha256(scope["method"].encode() + b" " + scope["path"].encode() + b"\0" + body).hexdigest()
+
+        owner = uuid.uuid4().hex
+        stored = await self._claim(scoped_key, fingerprint, owner)
+        if stored is not None:
+            if stored["fingerprint"] != fingerprint:
+                await _send_json(send, 422, {"detail": "Idempotency-Key já utilizada com outra requisição"})
+            elif stored.get("response") is None:
+                await _send_json(send, 409, {"detail": "Requisição original ainda em processamento"})
+            else:
+                await _replay(send, stored["response"])
+            return
+
+        status_code, response_headers, chunks = None, [], []
+
+        async def capture(message):
+            nonlocal status_code, response_headers
+            if message["type"] == "http.response.start":
+                status_code = message["status"]
+                response_headers = list(message.get("headers", []))
+            elif message["type"] == "http.response.body":
+                chunks.append(message.get("body", b""))
+            await send(message)
+
+        sent = False
+
+        async def replay_receive():
+            nonlocal sent
+            if not sent:
+                sent = True
+                return {"type": "http.request", "body": body, "more_body": False}
+            return await receive()
+
+        collection = self.db[IDEMPOTENCY_COLLECTION]
+        # Filtering on owner keeps a request whose lease was taken over from touching the new claim
+        claim = {"_id": scoped_key, "owner": owner}
+        try:
+            await self.app(scope, replay_receive, capture)
+        except BaseException:
+            await collection.delete_one(claim)
+            raise
+        if status_code is None or status_code >= 500 or status_code in NOT_CACHED_STATUS:
+            await collection.delete_one(claim)
+            return
+        await collection.update_one(claim, {"$set": {"response": {
+            "status": status_code,
+            "headers": [[k.decode("latin-1"), v.decode("latin-1")] for k, v in response_headers],
+            "body": b"".join(chunks),
+        }}})
+
+    async def _claim(self, scoped_key: str, fingerprint: str, owner: str):
+        """Return None if this request now owns the key, else the stored record (after waiting for it)."""
+        from pymongo.errors import DuplicateKeyError
+
+        collection = self.db[IDEMPOTENCY_COLLECTION]
+        now = datetime.now(timezone.utc)
+        try:
+            await collection.insert_one({
+                "_id": scoped_key,
+                "fingerprint": fingerprint,
+                "response": None,
+                "owner": owner,
+                "lease_expires_at": now + timedelta(seconds=self.lease_seconds),
+                "created_at": now,
+            })
+            return None
+        except DuplicateKeyError:
+            pass
+
+        loop = asyncio.get_running_loop()
+        deadline = loop.time() + self.wait_timeout
+        delay = 0.02
+        while True:
+            # Take over an unfinished claim whose owner is gone; the filter makes this atomic
+            now = datetime.now(timezone.utc)
+            expired = await collection.find_one_and_update(
+                {"_id": scoped_key, "fingerprint": fingerprint, "response": None, "lease_expires_at": {"$lt": now}},
+                {"$set": {"owner": owner, "lease_expires_at": now + timedelta(seconds=self.lease_seconds)}},
+            )
+            if expired is not None:
+                return None
+            stored = await collection.find_one({"_id": scoped_key})
+            if stored is None:
+                # The first attempt failed and released the key; take it over
+                return await self._claim(scoped_key, fingerprint, owner)
+            if stored["response"] is not None or stored["fingerprint"] != fingerprint or loop.time() >= deadline:
+                return stored
+            await asyncio.sleep(delay)
+            delay = min(delay * 2, 0.5)
+
+
+async def _read_body(receive) -> bytes:
+    chunks = []
+    while True:
+        message = await receive()
+        chunks.append(message.get("body", b""))
+        if not message.get("more_body"):
+            return b"".join(chunks)
+
+
+async def _replay(send, response):
+    headers = [(k.encode("latin-1"), v.encode("latin-1")) for k, v in response["headers"]]
+    headers.append((b"idempotent-replayed", b"true"))
+    await send({"type": "http.response.start", "status": response["status"], "headers": headers})
+    await send({"type": "http.response.body", "body": bytes(response["body"])})
+
+
+async def _send_json(send, status, payload):
+    body = json.dumps(payload).encode()
+    await send({"type": "http.response.start", "status": status,
+                "headers": [(b"content-type", b"application/json"), (b"content-length", str(len(body)).encode())]})
+    await send({"type": "http.response.body", "body": body})
@@ -0,0 +1,140 @@
+import asyncio
+import logging
+from datetime import datetime, timezone
+
+from archive import NOT_DELETED, archive_name
+
+logger = logging.getLogger(__name__)
+
+INTEGRITY_POLICIES = ("restrict", "cascade")
+
+# Collection referenced by each foreign key on vendas
+VENDA_REFERENCES = {"carro_id": "carros", "cliente_id": "clientes", "funcionario_id": "funcionarios"}
+
+# Archived vendas still count as references
+VENDA_COLLECTIONS = ("vendas", archive_name("vendas"))
+
+
+async def create_integrity_indexes(db):
+    # funcionario_id is already the prefix of the (funcionario_id, data_venda) index on vendas
+    await db.vendas.create_index("carro_id")
+    await db.vendas.create_index("cliente_id")
+    for field in VENDA_REFERENCES:
+        await db[archive_name("vendas")].create_index(field)
+    # Reference lookups by id ($in batches here, in reports and in pricing) must not scan
+    for collection in VENDA_REFERENCES.values():
+        await db[collection].create_index("id", unique=True)
+        # Archives are written by _id upserts; a plain index never makes _move fail
+        await db[archive_name(collection)].create_index("id")
+
+
+async def has_vendas(db, field: str, value: str) -> bool:
+    """Whether any active or archived venda references ``value``; index probes that stop at the first match."""
+    for collection in VENDA_COLLECTIONS:
+        if await db[collection].find({field: value, **NOT_DELETED}, {"_id": 1}).limit(1).to_list(1):
+            return True
+    return False
+
+
+async def iter_referencing_vendas(db, field: str, value: str, batch_size: int = 500):
+    """Yield ``(collection, batch)`` for vendas referencing ``value`` in vendas and vendas_archive, paging on _id."""
+    for collection in VENDA_COLLECTIONS:
+        last_id = None
+        while True:
+            query = {field: value, **NOT_DELETED}
+            if last_id is not None:
+                query["_id"] = {"$gt": last_id}
+            batch = await db[collection].find(query).sort("_id", 1).limit(batch_size).to_list(batch_size)
+            if not batch:
+                break
+            yield collection, batch
+            last_id = batch[-1]["_id"]
+
+
+async def _existing_ids(db, collection: str, ids: set) -> set:
+    found = await db[collection].find({"id": {"$in": list(ids)}, **NOT_DELETED}, {"_id": 0, "id": 1}).to_list(None)
+    existing = {d["id"] for d in found}
+    missing = ids - existing
+    if missing:
+        # Old sold carros move to the archive together with their vendas
+        found = await db[archive_name(collection)].find(
+            {"id": {"$in": list(missing)}, **NOT_DELETED}, {"_id": 0, "id": 1}
+        ).to_list(None)
+        existing |= {d["id"] for d in found}
+    return existing
+
+
+class IntegrityScanner:
+    """Background check for vendas whose carro, cliente or funcionário is missing or deleted.
+
+    Walks ``vendas`` and then ``vendas_archive`` in ``_id`` order,
+    ``batch_size`` documents per pass, and resolves each batch's references
+    with one ``$in`` query on the ``id`` index per collection instead of
+    joining the whole collection. Orphans are logged and kept in
+    ``last_report`` (up to ``max_reported``).
+    """
+
+    def __init__(self, batch_size: int = 500, max_reported: int = 1000):
+        self.batch_size = batch_size
+        self.max_reported = max_reported
+        self.last_report: dict = {}
+        self.metrics = {"varreduras": 0, "vendas_verificadas": 0, "orfas": 0, "falhas": 0}
+
+    async def scan(self, db) -> dict:
+        started_at = datetime.now(timezone.utc).isoformat()
+        orphans = []
+        checked = 0
+        total = 0
+        projection = {"_id": 1, "id": 1, **{field: 1 for field in VENDA_REFERENCES}}
+        for venda_collection in VENDA_COLLECTIONS:
+            last_id = None
+            while True:
+                query = dict(NOT_DELETED)
+                if last_id is not None:
+                    query["_id"] = {"$gt": last_id}
+                batch = await db[venda_collection].find(query, projection).sort("_id", 1).limit(self.batch_size).to_list(self.batch_size)
+                if not batch:
+                    break
+                last_id = batch[-1]["_id"]
+                checked += len(batch)
+
+                existing = {}
+                for field, collection in VENDA_REFERENCES.items():
+                    existing[field] = await _existing_ids(db, collection, {v[field] for v in batch})
+                for venda in batch:
+                    missing = [field for field in VENDA_REFERENCES if venda[field] not in existing[field]]
+                    if missing:
+                        total += 1
+                        if len(orphans) < self.max_reported:
+                            orphans.append({
+                                "venda_id": venda["id"],
+                                "colecao": venda_collection,
+                                "referencias_ausentes": missing,
+                            })
+                # Yield between batches so request handlers are not starved
+                await asyncio.sleep(0)
+
+        self.last_report = {
+            "iniciado_em": started_at,
+            "concluido_em": datetime.now(timezone.utc).isoformat(),
+            "vendas_verificadas": checked,
+            "total_orfas": total,
+            "orfas": orphans,
+        }
+        self.metrics["varreduras"] += 1
+        self.metrics["vendas_verificadas"] += checked
+        self.metrics["orfas"] = total
+        if total:
+            logger.warning("Verificação de integridade: %d vendas órfãs de %d verificadas", total, checked)
+        return self.last_report
+
+    async def run(self, db, interval_seconds: float):
+        while True:
+            try:
+                await self.scan(db)
+            except asyncio.CancelledError:
+                raise
+            except Exception:
+                self.metrics["falhas"] += 1
+                logger.exception("Falha na verificação de integridade")
+            await asyncio.sleep(interval_seconds)
@@ -0,0 +1,155 @@
+import asyncio
+import uuid
+from collections import defaultdict
+from datetime import datetime, timedelta, timezone
+from pathlib import Path
+from typing import Optional
+
+RANKING_COLLECTION = "vendas_ranking"
+TOTAL_PERIOD = "total"
+# Single document whose presence means a rebuild is running somewhere
+REBUILD_LOCK_COLLECTION = "vendas_ranking_lock"
+REBUILD_LOCK_TTL = timedelta(minutes=30)
+
+
+def periods_for(data_venda: str) -> list:
+    # data_venda is an ISO timestamp: "2025-03-14T..." -> ["2025-03", "2025", "total"]
+    return [data_venda[:7], data_venda[:4], TOTAL_PERIOD]
+
+
+async def record_venda(db, venda: dict, sign: int = 1):
+    """Apply one venda (sign=1) or its removal (sign=-1) to every period aggregate it belongs to."""
+    from pymongo import UpdateOne
+
+    ops = [
+        UpdateOne(
+            {"periodo": periodo, "funcionario_id": venda["funcionario_id"]},
+            {"$inc": {"quantidade": sign, "receita": sign * venda["valor_venda"]}},
+            upsert=True,
+        )
+        for periodo in periods_for(venda["data_venda"])
+    ]
+    await db[RANKING_COLLECTION].bulk_write(ops, ordered=False)
+
+
+async def top_funcionarios(db, periodo: str, ordenar: str = "receita", limite: int = 10) -> list:
+    entries = await db[RANKING_COLLECTION].find(
+        {"periodo": periodo, "quantidade": {"$gt": 0}}, {"_id": 0}
+    ).sort([(ordenar, -1), ("funcionario_id", 1)]).limit(limite).to_list(limite)
+
+    ids = [e["funcionario_id"] for e in entries]
+    nomes = {
+        f["id"]: f["nome"]
+        for f in await db.funcionarios.find({"id": {"$in": ids}}, {"_id": 0, "id": 1, "nome": 1}).to_list(len(ids))
+    }
+    return [{**e, "nome": nomes.get(e["funcionario_id"], "")} for e in entries]
+
+
+async def create_ranking_indexes(db, collection: str = RANKING_COLLECTION):
+    await db[collection].create_index([("periodo", 1), ("funcionario_id", 1)], unique=True)
+    # funcionario_id is the tie-break in top_funcionarios, so the sort is fully covered
+    for field in ("receita", "quantidade"):
+        legacy = f"periodo_1_{field}_-1"
+        if legacy in await db[collection].index_information():
+            await db[collection].drop_index(legacy)
+        await db[collection].create_index([("periodo", 1), (field, -1), ("funcionario_id", 1)])
+
+
+async def _acquire_rebuild_lock(db) -> bool:
+    from pymongo.errors import DuplicateKeyError
+
+    now = datetime.now(timezone.utc)
+    locks = db[REBUILD_LOCK_COLLECTION]
+    try:
+        await locks.insert_one({"_id": "rebuild", "expires_at": now + REBUILD_LOCK_TTL})
+        return True
+    except DuplicateKeyError:
+        # Take over a lock left behind by a crashed rebuild
+        stale = await locks.find_one_and_update(
+            {"_id": "rebuild", "expires_at": {"$lt": now}}, {"$set": {"expires_at": now + REBUILD_LOCK_TTL}}
+        )
+        return stale is not None
+
+
+async def rebuild_ranking(db) -> Optional[int]:
+    """Recompute every period aggregate from vendas and vendas_archive (backfill/repair).
+
+    Run it with sale writes paused: record_venda increments that land between
+    the aggregation and the swap are lost. Concurrent rebuilds are serialized
+    by a lock document; a call that finds the lock held returns None.
+    """
+    if not await _acquire_rebuild_lock(db):
+        return None
+    try:
+        return await _rebuild_ranking(db)
+    finally:
+        await db[REBUILD_LOCK_COLLECTION].delete_one({"_id": "rebuild"})
+
+
+async def _rebuild_ranking(db) -> int:
+    pipeline = [
+        {"$match": {"deleted_at": None}},
+        {"$group": {
+            # $substr is the $substrBytes alias; data_venda is ASCII
+            "_id": {"mes": {"$substr": ["$data_venda", 0, 7]}, "funcionario_id": "$funcionario_id"},
+            "quantidade": {"$sum": 1},
+            "receita": {"$sum": "$valor_venda"},
+        }},
+    ]
+    totals = defaultdict(lambda: {"quantidade": 0, "receita": 0.0})
+    for collection in ("vendas", "vendas_archive"):
+        async for row in db[collection].aggregate(pipeline):
+            mes, funcionario_id = row["_id"]["mes"], row["_id"]["funcionario_id"]
+            for periodo in (mes, mes[:4], TOTAL_PERIOD):
+                totals[(periodo, funcionario_id)]["quantidade"] += row["quantidade"]
+                totals[(periodo, funcionario_id)]["receita"] += row["receita"]
+
+    docs = [
+        {"periodo": periodo, "funcionario_id": funcionario_id, **values}
+        for (periodo, funcionario_id), values in totals.items()
+    ]
+    # Build aside and swap in, so readers never see a half-built ranking
+    staging = f"{RANKING_COLLECTION}_rebuild_{uuid.uuid4().hex[:8]}"
+    if not docs:
+        await db[RANKING_COLLECTION].delete_many({})
+        return 0
+    try:
+        await create_ranking_indexes(db, staging)
+        await db[staging].insert_many(docs)
+        await db[staging].rename(RANKING_COLLECTION, dropTarget=True)
+    except BaseException:
+        await db[staging].drop()
+        raise
+    return len(docs)
+
+
+async def ensure_ranking(db) -> Optional[int]:
+    """Backfill the aggregates once on a database whose vendas predate them; returns the number built.
+
+    Called at startup, before this worker serves writes; with several workers
+    booting at once only the one holding the rebuild lock does the work.
+    """
+    if await db[RANKING_COLLECTION].find_one({}, {"_id": 1}):
+        return 0
+    if not (await db.vendas.find_one({}, {"_id": 1}) or await db.vendas_archive.find_one({}, {"_id": 1})):
+        return 0
+    return await rebuild_ranking(db)
+
+
+async def main():
+    from dotenv import load_dotenv
+    from database import LazyDatabase
+
+    load_dotenv(Path(__file__).parent / '.env')
+    db = LazyDatabase()
+    await create_ranking_indexes(db)
+    count = await rebuild_ranking(db)
+    if count is None:
+        print("⏳ Outra reconstrução do ranking está em andamento")
+    else:
+        print(f"🏆 Ranking reconstruído: {count} agregados por período")
+    db.close()
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
@@ -0,0 +1,122 @@
+from typing import Dict
+
+import numpy as np
+
+GROUP_FIELDS = ("marca", "modelo", "cor", "portas")
+PERCENTILES = (10, 25, 50, 75, 90)
+
+
+async def load_carro_columns(db, query: dict, batch_size: int = 10_000) -> dict:
+    """Fetch only preco and the grouping fields, building column arrays batch by batch.
+
+    Grouping fields are dictionary-encoded while loading: ``columns[field]``
+    holds int codes and ``columns["labels"][field]`` the label of each code.
+    """
+    projection = {"_id": 0, "preco": 1, **{field: 1 for field in GROUP_FIELDS}}
+    chunks = {field: [] for field in ("preco",) + GROUP_FIELDS}
+    vocabularies = {field: {} for field in GROUP_FIELDS}
+    rows = []
+    async for carro in db.carros.find(query, projection).batch_size(batch_size):
+        rows.append(carro)
+        if len(rows) >= batch_size:
+            _append_chunk(chunks, vocabularies, rows)
+            rows = []
+    if rows:
+        _append_chunk(chunks, vocabularies, rows)
+
+    columns = {
+        field: np.concatenate(parts) if parts else np.array([], dtype=float if field == "preco" else np.int32)
+        for field, parts in chunks.items()
+    }
+    columns["labels"] = {field: list(vocabulary) for field, vocabulary in vocabularies.items()}
+    return columns
+
+
+def _append_chunk(chunks, vocabularies, rows):
+    count = len(rows)
+    chunks["preco"].append(np.fromiter((r.get("preco", np.nan) for r in rows), dtype=float, count=count))
+    for field in GROUP_FIELDS:
+        vocabulary = vocabularies[field]
+        chunks[field].append(np.fromiter(
+            (vocabulary.setdefault(str(r.get(field, "")), len(vocabulary)) for r in rows), dtype=np.int32, count=count
+        ))
+
+
+def summarize(values: np.ndarray) -> dict:
+    values = values[~np.isnan(values)]
+    if values.size == 0:
+        return {"quantidade": 0, "minimo": None, "maximo": None, "media": None,
+                "mediana": None, "p10": None, "p25": None, "p75": None, "p90": None}
+    p10, p25, p50, p75, p90 = np.percentile(values, PERCENTILES)
+    return {
+        "quantidade": int(values.size),
+        "minimo": float(values.min()),
+        "maximo": float(values.max()),
+        "media": float(values.mean()),
+        "mediana": float(p50),
+        "p10": float(p10),
+        "p25": float(p25),
+        "p75": float(p75),
+        "p90": float(p90),
+    }
+
+
+def group_summaries(codes: np.ndarray, labels: list, values: np.ndarray) -> Dict[str, dict]:
+    # Sort once by group code, then summarize each contiguous slice
+    order = np.argsort(codes, kind="stable")
+    bounds = np.searchsorted(codes[order], np.arange(len(labels) + 1))
+    sorted_values = values[order]
+    return {
+        label: summarize(sorted_values[bounds[i]:bounds[i + 1]])
+        for i, label in sorted(enumerate(labels), key=lambda item: item[1])
+        if bounds[i + 1] > bounds[i]
+    }
+
+
+def price_statistics(columns: dict) -> dict:
+    precos = columns["preco"]
+    stats = {"geral": summarize(precos)}
+    for field in GROUP_FIELDS:
+        stats[f"por_{field}"] = group_summaries(columns[field], columns["labels"][field], precos)
+    return stats
+
+
+async def load_discount_columns(db, query: dict, batch_size: int = 10_000):
+    """Return (preco, valor_venda) arrays for sold cars, joining each vendas batch with one carros lookup."""
+    precos, valores = [], []
+    batch = []
+
+    async def flush():
+        # An index probe per id thanks to the unique carros.id index (integrity.create_integrity_indexes)
+        carros = await db.carros.find(
+            {"id": {"$in": [v["carro_id"] for v in batch]}}, {"_id": 0, "id": 1, "preco": 1}
+        ).to_list(len(batch))
+        preco_by_id = {c["id"]: c["preco"] for c in carros}
+        pairs = [(preco_by_id[v["carro_id"]], v["valor_venda"]) for v in batch if v["carro_id"] in preco_by_id]
+        if pairs:
+            array = np.array(pairs, dtype=float)
+            precos.append(array[:, 0])
+            valores.append(array[:, 1])
+
+    async for venda in db.vendas.find(query, {"_id": 0, "carro_id": 1, "valor_venda": 1}).batch_size(batch_size):
+        batch.append(venda)
+        if len(batch) >= batch_size:
+            await flush()
+            batch = []
+    if batch:
+        await flush()
+    if not precos:
+        return np.array([]), np.array([])
+    return np.concatenate(precos), np.concatenate(valores)
+
+
+def discount_statistics(precos: np.ndarray, valores: np.ndarray) -> dict:
+    if precos.size == 0:
+        return {"vendas": 0, "desconto_medio": None, "desconto_medio_percentual": None}
+    descontos = precos - valores
+    valid = precos > 0
+    return {
+        "vendas": int(precos.size),
+        "desconto_medio": float(descontos.mean()),
+        "desconto_medio_percentual": float((descontos[valid] / precos[valid]).mean() * 100) if valid.any() else None,
+    }
@@ -0,0 +1,143 @@
+import cProfile
+import io
+import marshal
+import pstats
+import random
+import time
+import tracemalloc
+import uuid
+from collections import deque
+from datetime import datetime, timezone
+from typing import Deque, Dict, Optional
+
+from starlette.concurrency import run_in_threadpool
+
+PROFILE_HEADER = b"x-profile"
+
+
+class ProfileStore:
+    """Keeps the most recent request profiles in memory for download."""
+
+    def __init__(self, max_profiles: int = 50):
+        self._profiles: Deque[Dict] = deque(maxlen=max_profiles)
+
+    def add(self, profile: Dict):
+        self._profiles.append(profile)
+
+    def list(self):
+        return [
+            {k: v for k, v in p.items() if k not in ("stats", "stats_text", "allocations_text")}
+            for p in reversed(self._profiles)
+        ]
+
+    def get(self, profile_id: str) -> Optional[Dict]:
+        return next((p for p in self._profiles if p["id"] == profile_id), None)
+
+
+class ProfilingMiddleware:
+    """Capture cProfile call stats and tracemalloc allocations for selected requests.
+
+    A request is profiled when it sends ``X-Profile: 1`` or is picked by the
+    sample rate, one at a time. cProfile and tracemalloc cover the whole
+    event-loop thread, so whatever other requests run while the profiled one
+    awaits is recorded too; each profile keeps the peak number of concurrent
+    requests (``concurrent_requests``) so such mixed profiles can be spotted.
+    Snapshot comparison and report building run in a worker thread.
+    """
+
+    def __init__(self, app, store: ProfileStore, enabled: bool = False, sample_rate: float = 0.0, top_n: int = 40):
+        self.app = app
+        self.store = store
+        self.enabled = enabled
+        self.sample_rate = sample_rate
+        self.top_n = top_n
+        self._busy = False
+        self._in_flight = 0
+        self._peak_in_flight = 0
+
+    def _should_profile(self, scope) -> bool:
+        if not self.enabled or scope["type"] != "http" or self._busy:
+            return False
+        for name, value in scope["headers"]:
+            if name == PROFILE_HEADER:
+                return value in (b"1", b"true")
+        return self.sample_rate > 0 and random.random() < self.sample_rate
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+        self._in_flight += 1
+        self._peak_in_flight = max(self._peak_in_flight, self._in_flight)
+        try:
+            if self._should_profile(scope):
+                await self._profile(scope, receive, send)
+            else:
+                await self.app(scope, receive, send)
+        finally:
+            self._in_flight -= 1
+
+    async def _profile(self, scope, receive, send):
+        self._busy = True
+        self._peak_in_flight = self._in_flight
+        profile_id = str(uuid.uuid4())
+        status_code = None
+
+        async def send_wrapper(message):
+            nonlocal status_code
+            if message["type"] == "http.response.start":
+                status_code = message["status"]
+                message.setdefault("headers", []).append((b"x-profile-id", profile_id.encode()))
+            await send(message)
+
+        profiler = cProfile.Profile()
+        started_tracemalloc = not tracemalloc.is_tracing()
+        if started_tracemalloc:
+            tracemalloc.start(10)
+        before = await run_in_threadpool(tracemalloc.take_snapshot)
+        start = time.perf_counter()
+        profiler.enable()
+        try:
+            await self.app(scope, receive, send_wrapper)
+        finally:
+            profiler.disable()
+            duration_ms = (time.perf_counter() - start) * 1000
+            concurrent = self._peak_in_flight
+            try:
+                profile = await run_in_threadpool(
+                    self._build_profile, profile_id, scope, status_code, duration_ms, concurrent,
+                    profiler, before, started_tracemalloc,
+                )
+                self.store.add(profile)
+            finally:
+                self._busy = False
+
+    def _build_profile(self, profile_id, scope, status_code, duration_ms, concurrent, profiler, before, stop_tracemalloc):
+        after = tracemalloc.take_snapshot()
+        if stop_tracemalloc:
+            tracemalloc.stop()
+
+        stats_buffer = io.StringIO()
+        stats = pstats.Stats(profiler, stream=stats_buffer)
+        stats.sort_stats("cumulative").print_stats(self.top_n)
+
+        allocations = after.compare_to(before, "traceback")
+        allocations_text = "\n".join(
+            "\n".join([str(stat)] + ["    " + line for line in stat.traceback.format()])
+            for stat in allocations[: self.top_n]
+        )
+        return {
+            "id": profile_id,
+            "method": scope["method"],
+            "path": scope["path"],
+            "status_code": status_code,
+            "duration_ms": round(duration_ms, 3),
+            # Peak in-flight requests while profiling, this one included
+            "concurrent_requests": concurrent,
+            "allocated_bytes": sum(stat.size_diff for stat in allocations),
+            "created_at": datetime.now(timezone.utc).isoformat(),
+            # marshal of pstats' raw dict is the .prof format snakeviz/pstats load
+            "stats": marshal.dumps(stats.stats),
+            "stats_text": stats_buffer.getvalue(),
+            "allocations_text": allocations_text,
+        }
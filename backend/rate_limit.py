@@ -0,0 +1,103 @@
+import asyncio
+import math
+import time
+from contextlib import asynccontextmanager
+from typing import Callable, Dict, Optional, Tuple
+
+from fastapi import HTTPException
+
+
+class TokenBucket:
+    def __init__(self, capacity: float, refill_rate: float):
+        self.capacity = capacity
+        self.refill_rate = refill_rate  # tokens per second
+        self.tokens = capacity
+        self.updated = time.monotonic()
+
+    def consume(self, cost: float = 1.0) -> Tuple[bool, float]:
+        now = time.monotonic()
+        self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.refill_rate)
+        self.updated = now
+        if self.tokens >= cost:
+            self.tokens -= cost
+            return True, 0.0
+        # Seconds until enough tokens are available again
+        return False, (cost - self.tokens) / self.refill_rate
+
+
+class InMemoryRateLimitBackend:
+    """Per-process bucket storage. Swap for a shared backend (e.g. Redis) when running several workers."""
+
+    def __init__(self, max_keys: int = 100_000):
+        self.max_keys = max_keys
+        self._buckets: Dict[str, TokenBucket] = {}
+
+    async def consume(self, key: str, capacity: float, refill_rate: float, cost: float = 1.0) -> Tuple[bool, float]:
+        bucket = self._buckets.get(key)
+        if bucket is None:
+            if len(self._buckets) >= self.max_keys:
+                self._prune()
+            bucket = self._buckets[key] = TokenBucket(capacity, refill_rate)
+        return bucket.consume(cost)
+
+    def _prune(self):
+        # Drop buckets that have refilled completely; they behave like new ones anyway
+        now = time.monotonic()
+        for key, bucket in list(self._buckets.items()):
+            if bucket.tokens + (now - bucket.updated) * bucket.refill_rate >= bucket.capacity:
+                del self._buckets[key]
+        if len(self._buckets) >= self.max_keys:
+            self._buckets.clear()
+
+
+class RateLimiter:
+    def __init__(self, capacity: float, refill_rate: float, backend: Optional[InMemoryRateLimitBackend] = None):
+        self.capacity = capacity
+        self.refill_rate = refill_rate
+        self.backend = backend or InMemoryRateLimitBackend()
+
+    async def hit(self, key: str, cost: float = 1.0):
+        allowed, retry_after = await self.backend.consume(key, self.capacity, self.refill_rate, cost)
+        if not allowed:
+            raise HTTPException(
+                status_code=429,
+                detail="Muitas requisições. Tente novamente mais tarde",
+                headers={"Retry-After": str(math.ceil(retry_after))},
+            )
+
+
+class ConcurrencyLimiter:
+    def __init__(self, max_concurrent: int, queue_timeout: float):
+        self.queue_timeout = queue_timeout
+        self._semaphore = asyncio.BoundedSemaphore(max_concurrent)
+
+    async def acquire(self) -> Callable[[], None]:
+        """Take a slot, or raise 503 after ``queue_timeout``; returns an idempotent release.
+
+        For work that outlives the handler, such as a streamed response.
+        """
+        try:
+            await asyncio.wait_for(self._semaphore.acquire(), timeout=self.queue_timeout)
+        except asyncio.TimeoutError:
+            raise HTTPException(
+                status_code=503,
+                detail="Servidor sobrecarregado. Tente novamente mais tarde",
+                headers={"Retry-After": "1"},
+            )
+        released = False
+
+        def release():
+            nonlocal released
+            if not released:
+                released = True
+                self._semaphore.release()
+
+        return release
+
+    @asynccontextmanager
+    async def slot(self):
+        release = await self.acquire()
+        try:
+            yield
+        finally:
+            release()
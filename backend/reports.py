@@ -0,0 +1,79 @@
+import csv
+import io
+from typing import AsyncIterator
+
+VENDAS_CSV_HEADER = [
+    "venda_id", "data_venda", "valor_venda",
+    "carro_id", "marca", "modelo", "cor", "portas", "preco",
+    "cliente_id", "cliente_nome", "cliente_cpf", "cliente_email",
+    "funcionario_id", "funcionario_nome", "funcionario_cargo",
+]
+
+
+# Leading characters that make Excel/LibreOffice evaluate a cell as a formula
+FORMULA_PREFIXES = ("=", "+", "-", "@", "\t", "\r")
+
+
+def _cell(value):
+    # User-entered text (names, emails...) must not run as a formula when the file is opened
+    if isinstance(value, str) and value.startswith(FORMULA_PREFIXES):
+        return "'" + value
+    return value
+
+
+async def _lookup(db, collection, ids, projection):
+    # Relies on the id indexes from integrity.create_integrity_indexes; without them each batch scans the collection
+    docs = await db[collection].find({"id": {"$in": list(ids)}}, projection).to_list(len(ids))
+    found = {d["id"]: d for d in docs}
+    # Referenced records may have been moved to the archive
+    missing = [i for i in ids if i not in found]
+    if missing:
+        archived = await db[f"{collection}_archive"].find({"id": {"$in": missing}}, projection).to_list(len(missing))
+        found.update({d["id"]: d for d in archived})
+    return found
+
+
+async def iter_vendas_csv(db, query: dict, batch_size: int = 500, incluir_arquivados: bool = False) -> AsyncIterator[bytes]:
+    """Stream vendas joined with carro, cliente and funcionario as CSV, one batch at a time."""
+    buffer = io.StringIO()
+    writer = csv.writer(buffer)
+    # BOM so Excel opens accented names correctly
+    buffer.write("\ufeff")
+    writer.writerow(VENDAS_CSV_HEADER)
+
+    # Archived vendas are older than any hot one, so they go first to keep date order
+    collections = ["vendas_archive", "vendas"] if incluir_arquivados else ["vendas"]
+    batch = []
+    for collection in collections:
+        cursor = db[collection].find(query, {"_id": 0}).sort("data_venda", 1).batch_size(batch_size)
+        async for venda in cursor:
+            batch.append(venda)
+            if len(batch) >= batch_size:
+                await _write_batch(db, writer, batch)
+                batch = []
+                yield buffer.getvalue().encode("utf-8")
+                buffer.seek(0)
+                buffer.truncate()
+    if batch:
+        await _write_batch(db, writer, batch)
+    yield buffer.getvalue().encode("utf-8")
+
+
+async def _write_batch(db, writer, batch):
+    carros = await _lookup(db, "carros", {v["carro_id"] for v in batch},
+                           {"_id": 0, "id": 1, "marca": 1, "modelo": 1, "cor": 1, "portas": 1, "preco": 1})
+    clientes = await _lookup(db, "clientes", {v["cliente_id"] for v in batch},
+                             {"_id": 0, "id": 1, "nome": 1, "cpf": 1, "email": 1})
+    funcionarios = await _lookup(db, "funcionarios", {v["funcionario_id"] for v in batch},
+                                 {"_id": 0, "id": 1, "nome": 1, "cargo": 1})
+    for venda in batch:
+        carro = carros.get(venda["carro_id"], {})
+        cliente = clientes.get(venda["cliente_id"], {})
+        funcionario = funcionarios.get(venda["funcionario_id"], {})
+        writer.writerow([_cell(value) for value in (
+            venda["id"], venda["data_venda"], venda["valor_venda"],
+            venda["carro_id"], carro.get("marca", ""), carro.get("modelo", ""), carro.get("cor", ""),
+            carro.get("portas", ""), carro.get("preco", ""),
+            venda["cliente_id"], cliente.get("nome", ""), cliente.get("cpf", ""), cliente.get("email", ""),
+            venda["funcionario_id"], funcionario.get("nome", ""), funcionario.get("cargo", ""),
+        )])
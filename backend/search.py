@@ -0,0 +1,62 @@
+import re
+import unicodedata
+
+NON_DIGITS = re.compile(r"\D")
+
+
+def normalize_text(value: str) -> str:
+    # Lowercase and strip accents so "José" and "jose" match the same prefix
+    decomposed = unicodedata.normalize("NFKD", value)
+    return "".join(ch for ch in decomposed if not unicodedata.combining(ch)).lower().strip()
+
+
+def only_digits(value: str) -> str:
+    return NON_DIGITS.sub("", value)
+
+
+def cliente_search_fields(cliente: dict) -> dict:
+    """Denormalized lookup keys stored alongside each cliente for indexed search."""
+    fields = {}
+    if cliente.get("nome") is not None:
+        fields["nome_normalizado"] = normalize_text(cliente["nome"])
+    if cliente.get("cpf") is not None:
+        fields["cpf_digits"] = only_digits(cliente["cpf"])
+    if cliente.get("telefone") is not None:
+        fields["telefone_digits"] = only_digits(cliente["telefone"])
+    if cliente.get("email") is not None:
+        fields["email_lower"] = cliente["email"].lower()
+    return fields
+
+
+def cliente_search_query(q: str):
+    """Return (filter, uses_text_index) for a counter lookup term."""
+    q = q.strip()
+    if "@" in q:
+        return {"email_lower": {"$regex": "^" + re.escape(q.lower())}}, False
+    digits = only_digits(q)
+    if digits and not re.search(r"[^\d\s.\-/()+]", q):
+        prefix = "^" + digits
+        return {"$or": [{"cpf_digits": {"$regex": prefix}}, {"telefone_digits": {"$regex": prefix}}]}, False
+    return {"$text": {"$search": q}}, True
+
+
+def cliente_name_prefix_query(q: str) -> dict:
+    # Fallback for partially typed names, which $text does not match
+    return {"nome_normalizado": {"$regex": "^" + re.escape(normalize_text(q))}}
+
+
+async def backfill_cliente_search_fields(db, batch_size: int = 500) -> int:
+    """Populate lookup keys on clientes inserted before they existed."""
+    from pymongo import UpdateOne
+
+    updated = 0
+    ops = []
+    cursor = db.clientes.find({"cpf_digits": {"$exists": False}}, {"_id": 1, "nome": 1, "cpf": 1, "telefone": 1, "email": 1})
+    async for cliente in cursor.batch_size(batch_size):
+        ops.append(UpdateOne({"_id": cliente["_id"]}, {"$set": cliente_search_fields(cliente)}))
+        if len(ops) >= batch_size:
+            updated += (await db.clientes.bulk_write(ops, ordered=False)).modified_count
+            ops = []
+    if ops:
+        updated += (await db.clientes.bulk_write(ops, ordered=False)).modified_count
+    return updated
@@ -8,15 +8,19 @@ import uuid
 from datetime import datetime, timezone, timedelta
 import random
 
+from leaderboard import rebuild_ranking
+
 ROOT_DIR = Path(__file__).parent
 load_dotenv(ROOT_DIR / '.env')
 
 pwd_context = CryptContext(schemes=["bcrypt"], deprecated="auto")
 
-async def seed_database():
-    mongo_url = os.environ['MONGO_URL']
-    client = AsyncIOMotorClient(mongo_url)
-    db = client[os.environ['DB_NAME']]
+async def seed_database(db=None):
+    client = None
+    if db is None:
+        mongo_url = os.environ['MONGO_URL']
+        client = AsyncIOMotorClient(mongo_url)
+        db = client[os.environ['DB_NAME']]
     
     print("🌱 Iniciando seed do banco de dados...")
     
@@ -127,13 +131,18 @@ async def seed_database():
     await db.vendas.insert_many(vendas)
     print(f"✅ {len(vendas)} vendas criadas")
     
+    # Ranking aggregates for the seeded vendas
+    await rebuild_ranking(db)
+    print("✅ Ranking de vendas reconstruído")
+    
     print("\n🎉 Seed concluído com sucesso!")
     print("\n📧 Credenciais de login:")
     print("Email: joao@carroamarelo.com")
     print("Senha: senha123")
     print("\n(Todos os funcionários usam a senha: senha123)")
     
-    client.close()
+    if client:
+        client.close()
 
 if __name__ == "__main__":
     asyncio.run(seed_database())
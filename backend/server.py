@@ -1,35 +1,130 @@
-from fastapi import FastAPI, APIRouter, HTTPException, Depends, status
+from fastapi import FastAPI, APIRouter, HTTPException, Depends, Query, Request, status
+from fastapi.concurrency import run_in_threadpool
+from fastapi.responses import PlainTextResponse, Response, StreamingResponse
 from fastapi.security import HTTPBearer, HTTPAuthorizationCredentials
 from dotenv import load_dotenv
+from starlette.background import BackgroundTask
 from starlette.middleware.cors import CORSMiddleware
-from motor.motor_asyncio import AsyncIOMotorClient
+import asyncio
 import os
 import logging
+from contextlib import asynccontextmanager
+from functools import lru_cache
 from pathlib import Path
 from pydantic import BaseModel, Field, ConfigDict, EmailStr
-from typing import List, Optional
+from typing import Dict, List, Optional
 import uuid
-from datetime import datetime, timezone, timedelta
-from passlib.context import CryptContext
-import jwt
+from datetime import date, datetime, timezone, timedelta
+
+from rate_limit import RateLimiter, ConcurrencyLimiter, InMemoryRateLimitBackend
+from database import LazyDatabase
+from coalescing import CoalescingMetrics, SingleFlightMiddleware
+from idempotency import IdempotencyMiddleware, create_idempotency_indexes
+from integrity import (
+    INTEGRITY_POLICIES,
+    IntegrityScanner,
+    create_integrity_indexes,
+    has_vendas,
+    iter_referencing_vendas,
+)
+from audit import AuditLog, create_audit_indexes
+from archive import NOT_DELETED, find_with_archive, run_archiver, soft_delete_update
+from leaderboard import create_ranking_indexes, ensure_ranking, record_venda, top_funcionarios
+from profiling import ProfileStore, ProfilingMiddleware
+from reports import iter_vendas_csv
+from search import (
+    backfill_cliente_search_fields,
+    cliente_name_prefix_query,
+    cliente_search_fields,
+    cliente_search_query,
+)
 
 ROOT_DIR = Path(__file__).parent
 load_dotenv(ROOT_DIR / '.env')
 
-# MongoDB connection
-mongo_url = os.environ['MONGO_URL']
-client = AsyncIOMotorClient(mongo_url)
-db = client[os.environ['DB_NAME']]
+# MongoDB connection (client is created in the lifespan hook or on first use).
+# Reporting and list reads go through db.for_reads(), which follows READ_PREFERENCE
+# (or MONGO_READ_URL, a separate reporting deployment); writes and auth stay on the primary
+db = LazyDatabase(
+    read_preference=os.environ.get('READ_PREFERENCE', 'primary'),
+    max_staleness=int(os.environ.get('READ_MAX_STALENESS_SECONDS', -1)),
+)
 
 # Security
-pwd_context = CryptContext(schemes=["bcrypt"], deprecated="auto")
 security = HTTPBearer()
 SECRET_KEY = os.environ.get('SECRET_KEY', 'carro-amarelo-secret-key-2025')
 ALGORITHM = "HS256"
 ACCESS_TOKEN_EXPIRE_MINUTES = 1440  # 24 hours
 
-# Create the main app
-app = FastAPI()
+# Rate limiting and admission control
+rate_limit_backend = InMemoryRateLimitBackend()
+login_ip_limiter = RateLimiter(
+    capacity=float(os.environ.get('LOGIN_RATE_LIMIT_IP_BURST', 20)),
+    refill_rate=float(os.environ.get('LOGIN_RATE_LIMIT_IP_PER_SECOND', 0.5)),
+    backend=rate_limit_backend,
+)
+login_user_limiter = RateLimiter(
+    capacity=float(os.environ.get('LOGIN_RATE_LIMIT_USER_BURST', 5)),
+    refill_rate=float(os.environ.get('LOGIN_RATE_LIMIT_USER_PER_SECOND', 0.1)),
+    backend=rate_limit_backend,
+)
+heavy_user_limiter = RateLimiter(
+    capacity=float(os.environ.get('HEAVY_RATE_LIMIT_USER_BURST', 10)),
+    refill_rate=float(os.environ.get('HEAVY_RATE_LIMIT_USER_PER_SECOND', 1)),
+    backend=rate_limit_backend,
+)
+heavy_route_limiter = ConcurrencyLimiter(
+    max_concurrent=int(os.environ.get('HEAVY_ROUTE_MAX_CONCURRENT', 4)),
+    queue_timeout=float(os.environ.get('HEAVY_ROUTE_QUEUE_TIMEOUT', 2)),
+)
+# Only enable behind a reverse proxy that appends the client address to X-Forwarded-For
+TRUST_PROXY_HEADERS = os.environ.get('TRUST_PROXY_HEADERS', 'false').lower() == 'true'
+
+# Profiling (opt-in per request with X-Profile: 1, or sampled)
+PROFILING_ENABLED = os.environ.get('PROFILING_ENABLED', 'false').lower() == 'true'
+PROFILING_SAMPLE_RATE = float(os.environ.get('PROFILING_SAMPLE_RATE', 0))
+profile_store = ProfileStore(max_profiles=int(os.environ.get('PROFILING_MAX_PROFILES', 50)))
+
+# Write-behind audit log
+audit_log = AuditLog(
+    max_queue=int(os.environ.get('AUDIT_QUEUE_SIZE', 10000)),
+    batch_size=int(os.environ.get('AUDIT_BATCH_SIZE', 500)),
+    flush_interval=float(os.environ.get('AUDIT_FLUSH_INTERVAL', 1)),
+    overflow=os.environ.get('AUDIT_OVERFLOW_POLICY', 'drop_oldest'),
+)
+
+# Coalescing of identical concurrent GETs
+COALESCE_PATHS = [
+    p.strip() for p in os.environ.get(
+        'COALESCE_PATHS', '/api/carros,/api/clientes,/api/funcionarios,/api/vendas,/api/vendas/ranking,/api/dashboard/stats'
+    ).split(',') if p.strip()
+]
+coalescing_metrics = CoalescingMetrics()
+
+# Idempotency-Key handling for create routes
+IDEMPOTENCY_PATHS = [
+    p.strip() for p in os.environ.get(
+        'IDEMPOTENCY_PATHS', '/api/carros,/api/clientes,/api/funcionarios,/api/vendas'
+    ).split(',') if p.strip()
+]
+IDEMPOTENCY_TTL_SECONDS = int(os.environ.get('IDEMPOTENCY_TTL_SECONDS', 24 * 3600))
+IDEMPOTENCY_WAIT_TIMEOUT = float(os.environ.get('IDEMPOTENCY_WAIT_TIMEOUT', 10))
+IDEMPOTENCY_LEASE_SECONDS = float(os.environ.get('IDEMPOTENCY_LEASE_SECONDS', 60))
+
+# Archival of old sales and soft-deleted records
+ARCHIVE_ENABLED = os.environ.get('ARCHIVE_ENABLED', 'true').lower() == 'true'
+ARCHIVE_AFTER_MONTHS = int(os.environ.get('ARCHIVE_AFTER_MONTHS', 12))
+SOFT_DELETE_RETENTION_DAYS = int(os.environ.get('SOFT_DELETE_RETENTION_DAYS', 30))
+ARCHIVE_INTERVAL_SECONDS = float(os.environ.get('ARCHIVE_INTERVAL_SECONDS', 6 * 3600))
+
+# Referential integrity between vendas and the records they reference
+INTEGRITY_ON_DELETE = os.environ.get('INTEGRITY_ON_DELETE', 'restrict')
+if INTEGRITY_ON_DELETE not in INTEGRITY_POLICIES:
+    raise ValueError(f"INTEGRITY_ON_DELETE must be one of {INTEGRITY_POLICIES}")
+INTEGRITY_SCAN_ENABLED = os.environ.get('INTEGRITY_SCAN_ENABLED', 'true').lower() == 'true'
+INTEGRITY_SCAN_INTERVAL_SECONDS = float(os.environ.get('INTEGRITY_SCAN_INTERVAL_SECONDS', 3600))
+integrity_scanner = IntegrityScanner(batch_size=int(os.environ.get('INTEGRITY_SCAN_BATCH_SIZE', 500)))
+
 api_router = APIRouter(prefix="/api")
 
 # Pydantic Models
@@ -78,6 +173,12 @@ class ClienteUpdate(BaseModel):
     email: Optional[EmailStr] = None
     endereco: Optional[str] = None
 
+class ClienteSearchResult(BaseModel):
+    items: List[Cliente]
+    total: int
+    page: int
+    page_size: int
+
 class Carro(BaseModel):
     model_config = ConfigDict(extra="ignore")
     id: str = Field(default_factory=lambda: str(uuid.uuid4()))
@@ -103,6 +204,30 @@ class CarroUpdate(BaseModel):
     portas: Optional[int] = None
     status: Optional[str] = None
 
+class PrecoStats(BaseModel):
+    quantidade: int
+    minimo: Optional[float] = None
+    maximo: Optional[float] = None
+    media: Optional[float] = None
+    mediana: Optional[float] = None
+    p10: Optional[float] = None
+    p25: Optional[float] = None
+    p75: Optional[float] = None
+    p90: Optional[float] = None
+
+class DescontoStats(BaseModel):
+    vendas: int
+    desconto_medio: Optional[float] = None
+    desconto_medio_percentual: Optional[float] = None
+
+class PrecoEstatisticas(BaseModel):
+    geral: PrecoStats
+    por_marca: Dict[str, PrecoStats]
+    por_modelo: Dict[str, PrecoStats]
+    por_cor: Dict[str, PrecoStats]
+    por_portas: Dict[str, PrecoStats]
+    desconto: DescontoStats
+
 class Venda(BaseModel):
     model_config = ConfigDict(extra="ignore")
     id: str = Field(default_factory=lambda: str(uuid.uuid4()))
@@ -126,6 +251,32 @@ class LoginResponse(BaseModel):
     token: str
     funcionario: Funcionario
 
+class RankingEntry(BaseModel):
+    funcionario_id: str
+    nome: str
+    quantidade: int
+    receita: float
+
+class RankingResponse(BaseModel):
+    periodo: str
+    ordenar: str
+    items: List[RankingEntry]
+
+class AuditEvent(BaseModel):
+    id: str
+    timestamp: str
+    actor_id: Optional[str] = None
+    actor_email: Optional[str] = None
+    action: str
+    entity: str
+    entity_id: Optional[str] = None
+    changes: dict = {}
+
+class AuditResult(BaseModel):
+    items: List[AuditEvent]
+    page: int
+    page_size: int
+
 class DashboardStats(BaseModel):
     total_carros: int
     carros_disponiveis: int
@@ -137,13 +288,20 @@ class DashboardStats(BaseModel):
     vendas_por_marca: dict
 
 # Auth functions
+@lru_cache(maxsize=1)
+def get_pwd_context():
+    # passlib/bcrypt are only needed once someone logs in or changes a password
+    from passlib.context import CryptContext
+    return CryptContext(schemes=["bcrypt"], deprecated="auto")
+
 def hash_password(password: str) -> str:
-    return pwd_context.hash(password)
+    return get_pwd_context().hash(password)
 
 def verify_password(plain_password: str, hashed_password: str) -> bool:
-    return pwd_context.verify(plain_password, hashed_password)
+    return get_pwd_context().verify(plain_password, hashed_password)
 
 def create_access_token(data: dict, expires_delta: timedelta = None):
+    import jwt
     to_encode = data.copy()
     if expires_delta:
         expire = datetime.now(timezone.utc) + expires_delta
@@ -154,13 +312,14 @@ def create_access_token(data: dict, expires_delta: timedelta = None):
     return encoded_jwt
 
 async def get_current_user(credentials: HTTPAuthorizationCredentials = Depends(security)):
+    import jwt
     try:
         token = credentials.credentials
         payload = jwt.decode(token, SECRET_KEY, algorithms=[ALGORITHM])
         email: str = payload.get("sub")
         if email is None:
             raise HTTPException(status_code=401, detail="Token inválido")
-        funcionario = await db.funcionarios.find_one({"email": email}, {"_id": 0, "senha": 0})
+        funcionario = await db.funcionarios.find_one({"email": email, **NOT_DELETED}, {"_id": 0, "senha": 0})
         if funcionario is None:
             raise HTTPException(status_code=401, detail="Usuário não encontrado")
         return funcionario
@@ -169,10 +328,21 @@ async def get_current_user(credentials: HTTPAuthorizationCredentials = Depends(s
     except Exception:
         raise HTTPException(status_code=401, detail="Não autorizado")
 
+def get_client_ip(request: Request) -> str:
+    forwarded = request.headers.get("x-forwarded-for")
+    if TRUST_PROXY_HEADERS and forwarded:
+        # Earlier hops are client-supplied; the right-most one was added by our proxy
+        return forwarded.split(",")[-1].strip()
+    return request.client.host if request.client else "unknown"
+
+async def limit_login_by_ip(request: Request):
+    await login_ip_limiter.hit(f"login:ip:{get_client_ip(request)}")
+
 # Auth endpoints
-@api_router.post("/auth/login", response_model=LoginResponse)
+@api_router.post("/auth/login", response_model=LoginResponse, dependencies=[Depends(limit_login_by_ip)])
 async def login(login_data: LoginRequest):
-    funcionario = await db.funcionarios.find_one({"email": login_data.email})
+    await login_user_limiter.hit(f"login:user:{login_data.email.lower()}")
+    funcionario = await db.funcionarios.find_one({"email": login_data.email, **NOT_DELETED})
     if not funcionario or not verify_password(login_data.senha, funcionario["senha"]):
         raise HTTPException(status_code=401, detail="Email ou senha incorretos")
     
@@ -181,6 +351,7 @@ async def login(login_data: LoginRequest):
     # Remove sensitive data
     funcionario.pop("senha")
     funcionario.pop("_id")
+    await audit_log.record(funcionario, "login", "funcionario", funcionario["id"])
     
     return {"token": access_token, "funcionario": funcionario}
 
@@ -191,13 +362,13 @@ async def get_me(current_user: dict = Depends(get_current_user)):
 # Funcionários endpoints
 @api_router.get("/funcionarios", response_model=List[Funcionario])
 async def get_funcionarios(current_user: dict = Depends(get_current_user)):
-    funcionarios = await db.funcionarios.find({}, {"_id": 0, "senha": 0}).to_list(1000)
+    funcionarios = await db.for_reads("funcionarios").funcionarios.find(NOT_DELETED, {"_id": 0, "senha": 0}).to_list(1000)
     return funcionarios
 
 @api_router.post("/funcionarios", response_model=Funcionario)
 async def create_funcionario(funcionario: FuncionarioCreate, current_user: dict = Depends(get_current_user)):
     # Check if email already exists
-    existing = await db.funcionarios.find_one({"email": funcionario.email})
+    existing = await db.funcionarios.find_one({"email": funcionario.email, **NOT_DELETED})
     if existing:
         raise HTTPException(status_code=400, detail="Email já cadastrado")
     
@@ -209,6 +380,7 @@ async def create_funcionario(funcionario: FuncionarioCreate, current_user: dict
     doc = func_obj.model_dump()
     doc["senha"] = func_dict["senha"]
     await db.funcionarios.insert_one(doc)
+    await audit_log.record(current_user, "create", "funcionario", func_obj.id, func_obj.model_dump())
     return func_obj
 
 @api_router.put("/funcionarios/{funcionario_id}", response_model=Funcionario)
@@ -221,31 +393,64 @@ async def update_funcionario(funcionario_id: str, funcionario: FuncionarioUpdate
     if not update_data:
         raise HTTPException(status_code=400, detail="Nenhum dado para atualizar")
     
-    result = await db.funcionarios.update_one({"id": funcionario_id}, {"$set": update_data})
+    result = await db.funcionarios.update_one({"id": funcionario_id, **NOT_DELETED}, {"$set": update_data})
     if result.matched_count == 0:
         raise HTTPException(status_code=404, detail="Funcionário não encontrado")
     
+    await audit_log.record(current_user, "update", "funcionario", funcionario_id, update_data)
     updated = await db.funcionarios.find_one({"id": funcionario_id}, {"_id": 0, "senha": 0})
     return updated
 
 @api_router.delete("/funcionarios/{funcionario_id}")
 async def delete_funcionario(funcionario_id: str, current_user: dict = Depends(get_current_user)):
-    result = await db.funcionarios.delete_one({"id": funcionario_id})
-    if result.deleted_count == 0:
+    await restrict_if_referenced("funcionario_id", funcionario_id, "Funcionário")
+    result = await db.funcionarios.update_one({"id": funcionario_id, **NOT_DELETED}, soft_delete_update())
+    if result.matched_count == 0:
         raise HTTPException(status_code=404, detail="Funcionário não encontrado")
+    await audit_log.record(current_user, "delete", "funcionario", funcionario_id)
+    await cascade_to_vendas("funcionario_id", funcionario_id, current_user)
     return {"message": "Funcionário excluído com sucesso"}
 
 # Clientes endpoints
 @api_router.get("/clientes", response_model=List[Cliente])
-async def get_clientes(current_user: dict = Depends(get_current_user)):
-    clientes = await db.clientes.find({}, {"_id": 0}).to_list(1000)
+async def get_clientes(incluir_arquivados: bool = False, current_user: dict = Depends(get_current_user)):
+    clientes = await find_with_archive(db.for_reads("clientes"), "clientes", NOT_DELETED, {"_id": 0}, 1000, incluir_arquivados)
     return clientes
 
+@api_router.get("/clientes/search", response_model=ClienteSearchResult)
+async def search_clientes(
+    q: str = Query(..., min_length=1),
+    page: int = Query(1, ge=1),
+    page_size: int = Query(20, ge=1, le=100),
+    current_user: dict = Depends(get_current_user),
+):
+    if not q.strip():
+        raise HTTPException(status_code=400, detail="Informe um termo de busca")
+    clientes = db.for_reads("clientes/search").clientes
+    query, uses_text_index = cliente_search_query(q)
+    query.update(NOT_DELETED)
+    if uses_text_index:
+        total = await clientes.count_documents(query)
+        if total == 0:
+            query, uses_text_index = {**cliente_name_prefix_query(q), **NOT_DELETED}, False
+    if not uses_text_index:
+        total = await clientes.count_documents(query)
+
+    skip = (page - 1) * page_size
+    if uses_text_index:
+        cursor = clientes.find(query, {"_id": 0, "score": {"$meta": "textScore"}}).sort([("score", {"$meta": "textScore"})])
+    else:
+        cursor = clientes.find(query, {"_id": 0}).sort("nome_normalizado", 1)
+    items = await cursor.skip(skip).limit(page_size).to_list(page_size)
+    return {"items": items, "total": total, "page": page, "page_size": page_size}
+
 @api_router.post("/clientes", response_model=Cliente)
 async def create_cliente(cliente: ClienteCreate, current_user: dict = Depends(get_current_user)):
     cliente_obj = Cliente(**cliente.model_dump())
     doc = cliente_obj.model_dump()
+    doc.update(cliente_search_fields(doc))
     await db.clientes.insert_one(doc)
+    await audit_log.record(current_user, "create", "cliente", cliente_obj.id, cliente_obj.model_dump())
     return cliente_obj
 
 @api_router.put("/clientes/{cliente_id}", response_model=Cliente)
@@ -253,32 +458,59 @@ async def update_cliente(cliente_id: str, cliente: ClienteUpdate, current_user:
     update_data = {k: v for k, v in cliente.model_dump().items() if v is not None}
     if not update_data:
         raise HTTPException(status_code=400, detail="Nenhum dado para atualizar")
+    update_data.update(cliente_search_fields(update_data))
     
-    result = await db.clientes.update_one({"id": cliente_id}, {"$set": update_data})
+    result = await db.clientes.update_one({"id": cliente_id, **NOT_DELETED}, {"$set": update_data})
     if result.matched_count == 0:
         raise HTTPException(status_code=404, detail="Cliente não encontrado")
     
+    await audit_log.record(current_user, "update", "cliente", cliente_id, update_data)
     updated = await db.clientes.find_one({"id": cliente_id}, {"_id": 0})
     return updated
 
 @api_router.delete("/clientes/{cliente_id}")
 async def delete_cliente(cliente_id: str, current_user: dict = Depends(get_current_user)):
-    result = await db.clientes.delete_one({"id": cliente_id})
-    if result.deleted_count == 0:
+    await restrict_if_referenced("cliente_id", cliente_id, "Cliente")
+    result = await db.clientes.update_one({"id": cliente_id, **NOT_DELETED}, soft_delete_update())
+    if result.matched_count == 0:
         raise HTTPException(status_code=404, detail="Cliente não encontrado")
+    await audit_log.record(current_user, "delete", "cliente", cliente_id)
+    await cascade_to_vendas("cliente_id", cliente_id, current_user)
     return {"message": "Cliente excluído com sucesso"}
 
 # Carros endpoints
 @api_router.get("/carros", response_model=List[Carro])
-async def get_carros(current_user: dict = Depends(get_current_user)):
-    carros = await db.carros.find({}, {"_id": 0}).to_list(1000)
+async def get_carros(incluir_arquivados: bool = False, current_user: dict = Depends(get_current_user)):
+    carros = await find_with_archive(db.for_reads("carros"), "carros", NOT_DELETED, {"_id": 0}, 1000, incluir_arquivados)
     return carros
 
+@api_router.get("/carros/precos/stats", response_model=PrecoEstatisticas)
+async def get_carros_precos_stats(
+    status: Optional[str] = Query("disponível", pattern="^(disponível|vendido|todos)$"),
+    current_user: dict = Depends(get_current_user),
+):
+    # numpy is only imported when this report is first requested
+    from pricing import discount_statistics, load_carro_columns, load_discount_columns, price_statistics
+
+    await heavy_user_limiter.hit(f"heavy:user:{current_user['id']}")
+    async with heavy_route_limiter.slot():
+        query = dict(NOT_DELETED)
+        if status != "todos":
+            query["status"] = status
+        reads = db.for_reads("carros/precos/stats")
+        columns = await load_carro_columns(reads, query)
+        precos, valores = await load_discount_columns(reads, NOT_DELETED)
+
+        stats = await run_in_threadpool(price_statistics, columns)
+        stats["desconto"] = discount_statistics(precos, valores)
+        return stats
+
 @api_router.post("/carros", response_model=Carro)
 async def create_carro(carro: CarroCreate, current_user: dict = Depends(get_current_user)):
     carro_obj = Carro(**carro.model_dump())
     doc = carro_obj.model_dump()
     await db.carros.insert_one(doc)
+    await audit_log.record(current_user, "create", "carro", carro_obj.id, carro_obj.model_dump())
     return carro_obj
 
 @api_router.put("/carros/{carro_id}", response_model=Carro)
@@ -287,42 +519,98 @@ async def update_carro(carro_id: str, carro: CarroUpdate, current_user: dict = D
     if not update_data:
         raise HTTPException(status_code=400, detail="Nenhum dado para atualizar")
     
-    result = await db.carros.update_one({"id": carro_id}, {"$set": update_data})
+    result = await db.carros.update_one({"id": carro_id, **NOT_DELETED}, {"$set": update_data})
     if result.matched_count == 0:
         raise HTTPException(status_code=404, detail="Carro não encontrado")
     
+    await audit_log.record(current_user, "update", "carro", carro_id, update_data)
     updated = await db.carros.find_one({"id": carro_id}, {"_id": 0})
     return updated
 
 @api_router.delete("/carros/{carro_id}")
 async def delete_carro(carro_id: str, current_user: dict = Depends(get_current_user)):
-    result = await db.carros.delete_one({"id": carro_id})
-    if result.deleted_count == 0:
+    await restrict_if_referenced("carro_id", carro_id, "Carro")
+    result = await db.carros.update_one({"id": carro_id, **NOT_DELETED}, soft_delete_update())
+    if result.matched_count == 0:
         raise HTTPException(status_code=404, detail="Carro não encontrado")
+    await audit_log.record(current_user, "delete", "carro", carro_id)
+    await cascade_to_vendas("carro_id", carro_id, current_user)
     return {"message": "Carro excluído com sucesso"}
 
 # Vendas endpoints
 @api_router.get("/vendas", response_model=List[Venda])
-async def get_vendas(current_user: dict = Depends(get_current_user)):
-    vendas = await db.vendas.find({}, {"_id": 0}).to_list(1000)
+async def get_vendas(incluir_arquivados: bool = False, current_user: dict = Depends(get_current_user)):
+    vendas = await find_with_archive(db.for_reads("vendas"), "vendas", NOT_DELETED, {"_id": 0}, 1000, incluir_arquivados)
     return vendas
 
+@api_router.get("/vendas/export")
+async def export_vendas(
+    data_inicio: Optional[date] = None,
+    data_fim: Optional[date] = None,
+    funcionario_id: Optional[str] = None,
+    incluir_arquivados: bool = False,
+    current_user: dict = Depends(get_current_user),
+):
+    await heavy_user_limiter.hit(f"heavy:user:{current_user['id']}")
+
+    query = dict(NOT_DELETED)
+    # data_venda is stored as an ISO string, so range filters compare lexicographically
+    if data_inicio or data_fim:
+        query["data_venda"] = {}
+        if data_inicio:
+            query["data_venda"]["$gte"] = data_inicio.isoformat()
+        if data_fim:
+            query["data_venda"]["$lt"] = (data_fim + timedelta(days=1)).isoformat()
+    if funcionario_id:
+        query["funcionario_id"] = funcionario_id
+
+    # The slot is held until the stream ends; taken here so overload can still answer 503
+    release = await heavy_route_limiter.acquire()
+
+    async def stream():
+        try:
+            async for chunk in iter_vendas_csv(db.for_reads("vendas/export"), query, incluir_arquivados=incluir_arquivados):
+                yield chunk
+        finally:
+            release()
+
+    filename = f"vendas_{datetime.now(timezone.utc).strftime('%Y%m%d_%H%M%S')}.csv"
+    return StreamingResponse(
+        stream(),
+        media_type="text/csv; charset=utf-8",
+        headers={"Content-Disposition": f'attachment; filename="{filename}"'},
+        # Also releases when the client disconnects before the stream starts
+        background=BackgroundTask(release),
+    )
+
+@api_router.get("/vendas/ranking", response_model=RankingResponse)
+async def get_vendas_ranking(
+    periodo: Optional[str] = Query(None, pattern=r"^(\d{4}(-\d{2})?|total)$"),
+    ordenar: str = Query("receita", pattern="^(receita|quantidade)$"),
+    limite: int = Query(10, ge=1, le=100),
+    current_user: dict = Depends(get_current_user),
+):
+    # Defaults to the current month; also accepts a year (YYYY) or "total"
+    periodo = periodo or datetime.now(timezone.utc).strftime("%Y-%m")
+    items = await top_funcionarios(db.for_reads("vendas/ranking"), periodo, ordenar, limite)
+    return {"periodo": periodo, "ordenar": ordenar, "items": items}
+
 @api_router.post("/vendas", response_model=Venda)
 async def create_venda(venda: VendaCreate, current_user: dict = Depends(get_current_user)):
     # Verify carro exists and is available
-    carro = await db.carros.find_one({"id": venda.carro_id})
+    carro = await db.carros.find_one({"id": venda.carro_id, **NOT_DELETED})
     if not carro:
         raise HTTPException(status_code=404, detail="Carro não encontrado")
     if carro["status"] == "vendido":
         raise HTTPException(status_code=400, detail="Carro já foi vendido")
     
     # Verify cliente exists
-    cliente = await db.clientes.find_one({"id": venda.cliente_id})
+    cliente = await db.clientes.find_one({"id": venda.cliente_id, **NOT_DELETED})
     if not cliente:
         raise HTTPException(status_code=404, detail="Cliente não encontrado")
     
     # Verify funcionario exists
-    funcionario = await db.funcionarios.find_one({"id": venda.funcionario_id})
+    funcionario = await db.funcionarios.find_one({"id": venda.funcionario_id, **NOT_DELETED})
     if not funcionario:
         raise HTTPException(status_code=404, detail="Funcionário não encontrado")
     
@@ -337,71 +625,157 @@ async def create_venda(venda: VendaCreate, current_user: dict = Depends(get_curr
     # Update carro status
     await db.carros.update_one({"id": venda.carro_id}, {"$set": {"status": "vendido"}})
     
+    # Update per-period ranking aggregates
+    await record_venda(db, doc)
+    await audit_log.record(current_user, "create", "venda", venda_obj.id, venda_obj.model_dump())
+    
     return venda_obj
 
 @api_router.delete("/vendas/{venda_id}")
 async def delete_venda(venda_id: str, current_user: dict = Depends(get_current_user)):
     # Get venda to revert carro status
-    venda = await db.vendas.find_one({"id": venda_id})
+    venda = await db.vendas.find_one({"id": venda_id, **NOT_DELETED})
     if not venda:
         raise HTTPException(status_code=404, detail="Venda não encontrada")
-    
+    await soft_delete_venda(venda, current_user)
+    return {"message": "Venda excluída com sucesso"}
+
+async def soft_delete_venda(venda: dict, current_user: dict, revert_carro: bool = True, collection: str = "vendas"):
     # Revert carro status
-    await db.carros.update_one({"id": venda["carro_id"]}, {"$set": {"status": "disponível"}})
+    if revert_carro:
+        await db.carros.update_one({"id": venda["carro_id"]}, {"$set": {"status": "disponível"}})
     
-    # Delete venda
-    await db.vendas.delete_one({"id": venda_id})
-    return {"message": "Venda excluída com sucesso"}
+    # Soft delete venda
+    await db[collection].update_one({"id": venda["id"]}, soft_delete_update())
+    await record_venda(db, venda, sign=-1)
+    await audit_log.record(current_user, "delete", "venda", venda["id"])
+
+# Referential integrity on delete
+async def restrict_if_referenced(field: str, entity_id: str, label: str):
+    if INTEGRITY_ON_DELETE == "restrict" and await has_vendas(db, field, entity_id):
+        raise HTTPException(status_code=409, detail=f"{label} possui vendas vinculadas e não pode ser excluído")
+
+async def cascade_to_vendas(field: str, entity_id: str, current_user: dict):
+    if INTEGRITY_ON_DELETE != "cascade":
+        return
+    async for collection, vendas in iter_referencing_vendas(db, field, entity_id):
+        for venda in vendas:
+            # A deleted carro stays deleted; otherwise it becomes available again
+            await soft_delete_venda(venda, current_user, revert_carro=field != "carro_id", collection=collection)
 
 # Dashboard endpoint
 @api_router.get("/dashboard/stats", response_model=DashboardStats)
-async def get_dashboard_stats(current_user: dict = Depends(get_current_user)):
-    carros = await db.carros.find({}, {"_id": 0}).to_list(1000)
-    vendas = await db.vendas.find({}, {"_id": 0}).to_list(1000)
-    clientes = await db.clientes.find({}, {"_id": 0}).to_list(1000)
-    funcionarios = await db.funcionarios.find({}, {"_id": 0}).to_list(1000)
+async def get_dashboard_stats(incluir_arquivados: bool = False, current_user: dict = Depends(get_current_user)):
+    await heavy_user_limiter.hit(f"heavy:user:{current_user['id']}")
+    async with heavy_route_limiter.slot():
+        reads = db.for_reads("dashboard/stats")
+        carros = await find_with_archive(reads, "carros", NOT_DELETED, {"_id": 0}, 1000, incluir_arquivados)
+        vendas = await find_with_archive(reads, "vendas", NOT_DELETED, {"_id": 0}, 1000, incluir_arquivados)
+        clientes = await reads.clientes.find(NOT_DELETED, {"_id": 0}).to_list(1000)
+        funcionarios = await reads.funcionarios.find(NOT_DELETED, {"_id": 0}).to_list(1000)
     
-    carros_disponiveis = len([c for c in carros if c["status"] == "disponível"])
-    carros_vendidos = len([c for c in carros if c["status"] == "vendido"])
-    total_vendas = sum([v["valor_venda"] for v in vendas])
+        carros_disponiveis = len([c for c in carros if c["status"] == "disponível"])
+        carros_vendidos = len([c for c in carros if c["status"] == "vendido"])
+        total_vendas = sum([v["valor_venda"] for v in vendas])
     
-    # Vendas por modelo
-    vendas_por_modelo = {}
-    for venda in vendas:
-        carro = next((c for c in carros if c["id"] == venda["carro_id"]), None)
-        if carro:
-            modelo = carro["modelo"]
-            vendas_por_modelo[modelo] = vendas_por_modelo.get(modelo, 0) + 1
+        # Vendas por modelo
+        vendas_por_modelo = {}
+        for venda in vendas:
+            carro = next((c for c in carros if c["id"] == venda["carro_id"]), None)
+            if carro:
+                modelo = carro["modelo"]
+                vendas_por_modelo[modelo] = vendas_por_modelo.get(modelo, 0) + 1
     
-    # Vendas por marca
-    vendas_por_marca = {}
-    for venda in vendas:
-        carro = next((c for c in carros if c["id"] == venda["carro_id"]), None)
-        if carro:
-            marca = carro["marca"]
-            vendas_por_marca[marca] = vendas_por_marca.get(marca, 0) + 1
+        # Vendas por marca
+        vendas_por_marca = {}
+        for venda in vendas:
+            carro = next((c for c in carros if c["id"] == venda["carro_id"]), None)
+            if carro:
+                marca = carro["marca"]
+                vendas_por_marca[marca] = vendas_por_marca.get(marca, 0) + 1
     
+        return {
+            "total_carros": len(carros),
+            "carros_disponiveis": carros_disponiveis,
+            "carros_vendidos": carros_vendidos,
+            "total_vendas": total_vendas,
+            "total_clientes": len(clientes),
+            "total_funcionarios": len(funcionarios),
+            "vendas_por_modelo": vendas_por_modelo,
+            "vendas_por_marca": vendas_por_marca
+        }
+
+# Audit endpoint
+@api_router.get("/audit", response_model=AuditResult)
+async def get_audit(
+    actor_id: Optional[str] = None,
+    entity: Optional[str] = None,
+    entity_id: Optional[str] = None,
+    data_inicio: Optional[datetime] = None,
+    data_fim: Optional[datetime] = None,
+    page: int = Query(1, ge=1),
+    page_size: int = Query(50, ge=1, le=500),
+    current_user: dict = Depends(get_current_user),
+):
+    query = {}
+    if actor_id:
+        query["actor_id"] = actor_id
+    if entity:
+        query["entity"] = entity
+    if entity_id:
+        query["entity_id"] = entity_id
+    if data_inicio or data_fim:
+        query["timestamp"] = {}
+        if data_inicio:
+            query["timestamp"]["$gte"] = data_inicio.astimezone(timezone.utc).isoformat()
+        if data_fim:
+            query["timestamp"]["$lte"] = data_fim.astimezone(timezone.utc).isoformat()
+
+    items = await db.for_reads("audit").audit.find(query, {"_id": 0}).sort("timestamp", -1).skip((page - 1) * page_size).limit(page_size).to_list(page_size)
+    return {"items": items, "page": page, "page_size": page_size}
+
+# Metrics endpoints
+@api_router.get("/admin/metrics")
+async def get_metrics(current_user: dict = Depends(get_current_user)):
     return {
-        "total_carros": len(carros),
-        "carros_disponiveis": carros_disponiveis,
-        "carros_vendidos": carros_vendidos,
-        "total_vendas": total_vendas,
-        "total_clientes": len(clientes),
-        "total_funcionarios": len(funcionarios),
-        "vendas_por_modelo": vendas_por_modelo,
-        "vendas_por_marca": vendas_por_marca
+        "coalescing": coalescing_metrics.snapshot(),
+        "audit": audit_log.metrics,
+        "integridade": integrity_scanner.metrics,
+        "leituras": db.read_routing,
     }
 
-# Include router
-app.include_router(api_router)
-
-app.add_middleware(
-    CORSMiddleware,
-    allow_credentials=True,
-    allow_origins=os.environ.get('CORS_ORIGINS', '*').split(','),
-    allow_methods=["*"],
-    allow_headers=["*"],
-)
+@api_router.get("/admin/integrity")
+async def get_integrity_report(executar: bool = False, current_user: dict = Depends(get_current_user)):
+    # executar=true runs a scan now instead of returning the last background one
+    if executar:
+        await heavy_user_limiter.hit(f"heavy:user:{current_user['id']}")
+        async with heavy_route_limiter.slot():
+            return await integrity_scanner.scan(db)
+    return integrity_scanner.last_report
+
+# Profiling endpoints
+@api_router.get("/admin/profiles")
+async def list_profiles(current_user: dict = Depends(get_current_user)):
+    return profile_store.list()
+
+@api_router.get("/admin/profiles/{profile_id}")
+async def download_profile(profile_id: str, formato: str = Query("txt", pattern="^(txt|prof)$"), current_user: dict = Depends(get_current_user)):
+    profile = profile_store.get(profile_id)
+    if not profile:
+        raise HTTPException(status_code=404, detail="Perfil não encontrado")
+    if formato == "prof":
+        return Response(
+            content=profile["stats"],
+            media_type="application/octet-stream",
+            headers={"Content-Disposition": f'attachment; filename="{profile_id}.prof"'},
+        )
+    header = (
+        f"{profile['method']} {profile['path']} -> {profile['status_code']} em {profile['duration_ms']} ms"
+        f" ({profile['concurrent_requests']} requisições simultâneas)\n\n"
+    )
+    return PlainTextResponse(
+        header + profile["stats_text"] + "\n\n# Alocações (tracemalloc)\n\n" + profile["allocations_text"]
+    )
 
 logging.basicConfig(
     level=logging.INFO,
@@ -409,6 +783,73 @@ logging.basicConfig(
 )
 logger = logging.getLogger(__name__)
 
-@app.on_event("shutdown")
-async def shutdown_db_client():
-    client.close()
+async def create_indexes():
+    await db.vendas.create_index("data_venda")
+    await db.vendas_archive.create_index("data_venda")
+    for collection in ("carros", "clientes", "funcionarios", "vendas"):
+        await db[collection].create_index("deleted_at", sparse=True)
+    await db.vendas.create_index([("funcionario_id", 1), ("data_venda", 1)])
+    await db.clientes.create_index([("nome", "text")], default_language="portuguese", name="clientes_nome_text")
+    for field in ("nome_normalizado", "cpf_digits", "telefone_digits", "email_lower"):
+        await db.clientes.create_index(field)
+    await create_ranking_indexes(db)
+    await ensure_ranking(db)
+    await create_audit_indexes(db)
+    await create_idempotency_indexes(db, IDEMPOTENCY_TTL_SECONDS)
+    await create_integrity_indexes(db)
+    await backfill_cliente_search_fields(db)
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    db.connect()
+    await create_indexes()
+    audit_log.start(db)
+    archiver = None
+    if ARCHIVE_ENABLED:
+        archiver = asyncio.create_task(
+            run_archiver(db, ARCHIVE_AFTER_MONTHS, SOFT_DELETE_RETENTION_DAYS, ARCHIVE_INTERVAL_SECONDS)
+        )
+    scanner = None
+    if INTEGRITY_SCAN_ENABLED:
+        scanner = asyncio.create_task(integrity_scanner.run(db, INTEGRITY_SCAN_INTERVAL_SECONDS))
+    yield
+    if archiver:
+        archiver.cancel()
+    if scanner:
+        scanner.cancel()
+    await audit_log.stop()
+    db.close()
+
+# Create the main app
+def create_app() -> FastAPI:
+    app = FastAPI(lifespan=lifespan)
+    app.include_router(api_router)
+
+    app.add_middleware(
+        ProfilingMiddleware,
+        store=profile_store,
+        enabled=PROFILING_ENABLED,
+        sample_rate=PROFILING_SAMPLE_RATE,
+    )
+
+    app.add_middleware(SingleFlightMiddleware, paths=COALESCE_PATHS, metrics=coalescing_metrics)
+
+    app.add_middleware(
+        IdempotencyMiddleware,
+        db=db,
+        paths=IDEMPOTENCY_PATHS,
+        wait_timeout=IDEMPOTENCY_WAIT_TIMEOUT,
+        lease_seconds=IDEMPOTENCY_LEASE_SECONDS,
+    )
+
+    app.add_middleware(
+        CORSMiddleware,
+        allow_credentials=True,
+        allow_origins=os.environ.get('CORS_ORIGINS', '*').split(','),
+        allow_methods=["*"],
+        allow_headers=["*"],
+        expose_headers=["X-Profile-Id", "Idempotent-Replayed"],
+    )
+    return app
+
+app = create_app()
@@ -0,0 +1,504 @@
+#!/usr/bin/env python3
+"""Run the backend_test.py scenarios in-process, concurrently, with no network.
+
+    pip install httpx mongomock-motor
+    python backend_test_local.py                 # in-memory mongomock database
+    python backend_test_local.py --mongo-url mongodb://localhost:27018   # throwaway mongod
+    python backend_test_local.py --replica-set   # local 2-member replica set, reads routed to the secondary
+"""
+
+import argparse
+import asyncio
+import json
+import sys
+import threading
+import time
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import AsyncExitStack, contextmanager
+from datetime import datetime, timedelta, timezone
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).parent / "backend"))
+
+from backend_test import CarroAmareloAPITester  # noqa: E402
+from harness import in_process_client, local_replica_set  # noqa: E402
+
+
+@contextmanager
+def overridden(module, **values):
+    """Temporarily replace module globals (limiters, settings) that handlers read at call time"""
+    saved = {name: getattr(module, name) for name in values}
+    for name, value in values.items():
+        setattr(module, name, value)
+    try:
+        yield
+    finally:
+        for name, value in saved.items():
+            setattr(module, name, value)
+
+
+class InProcessAPITester(CarroAmareloAPITester):
+    """Same scenarios as CarroAmareloAPITester, sent through an in-process ASGI client"""
+
+    def __init__(self, client, loop):
+        super().__init__(base_url=str(client.base_url).rstrip("/"))
+        self.client = client
+        self.loop = loop
+        self._lock = threading.Lock()
+
+    def send_request(self, method, url, headers, data=None):
+        # Scenarios run in worker threads; requests execute on the app's event loop
+        return self.on_loop(self.client.request(method, url, json=data, headers=headers))
+
+    def on_loop(self, coro):
+        return asyncio.run_coroutine_threadsafe(coro, self.loop).result()
+
+    def new_venda(self, cliente_id=None, funcionario_id=None, valor=70000.0):
+        """Sell a freshly created carro; returns the venda as stored by the API"""
+        carro = self.on_loop(self.client.post("/carros", json={
+            "modelo": "Cenário", "marca": "Fiat", "cor": "Prata", "preco": 75000.0, "portas": 4,
+        })).json()
+        self.created_ids['carros'].append(carro['id'])
+        cliente_id = cliente_id or self.on_loop(self.client.get("/clientes")).json()[0]['id']
+        funcionario_id = funcionario_id or self.on_loop(self.client.get("/funcionarios")).json()[0]['id']
+        response = self.on_loop(self.client.post("/vendas", json={
+            "carro_id": carro['id'], "cliente_id": cliente_id, "funcionario_id": funcionario_id, "valor_venda": valor,
+        }))
+        response.raise_for_status()
+        return response.json()
+
+    def test_coalescing(self):
+        """Identical concurrent GETs run once; another Authorization or query string is not merged"""
+        import server
+
+        print("\n🧲 Testing request coalescing...")
+        other = self.on_loop(self.client.get("/funcionarios")).json()[1]
+        login = self.on_loop(self.client.post("/auth/login", json={"email": other["email"], "senha": "senha123"}))
+        other_auth = {"Authorization": f"Bearer {login.json()['token']}"}
+
+        def counters():
+            return self.on_loop(self.client.get("/admin/metrics")).json()["coalescing"].get(
+                "/api/carros", {"executados": 0, "agrupados": 0}
+            )
+
+        # The in-memory database answers without yielding; slow the handler so the requests overlap
+        original = server.find_with_archive
+
+        async def slow_find_with_archive(*args, **kwargs):
+            await asyncio.sleep(0.05)
+            return await original(*args, **kwargs)
+
+        n = 5
+        before = counters()
+        server.find_with_archive = slow_find_with_archive
+        try:
+            async def burst():
+                return await asyncio.gather(
+                    *(self.client.get("/carros") for _ in range(n)),
+                    self.client.get("/carros", headers=other_auth),
+                    self.client.get("/carros", params={"incluir_arquivados": "false"}),
+                )
+            responses = self.on_loop(burst())
+        finally:
+            server.find_with_archive = original
+        after = counters()
+
+        executed = after["executados"] - before["executados"]
+        coalesced = after["agrupados"] - before["agrupados"]
+        self.log_test(
+            "Identical concurrent GETs execute once",
+            all(r.status_code == 200 for r in responses) and coalesced == n - 1,
+            f"executados=+{executed}, agrupados=+{coalesced}",
+        )
+        self.log_test(
+            "Different Authorization or query string is not merged",
+            executed == 3, f"executados=+{executed}",
+        )
+
+    def test_rate_limits(self):
+        """Login buckets answer 429 with Retry-After, X-Forwarded-For needs TRUST_PROXY_HEADERS, overload is 503"""
+        import server
+        from rate_limit import ConcurrencyLimiter, RateLimiter
+
+        print("\n🚦 Testing rate limits...")
+
+        def small():
+            # Two attempts, then practically no refill during the test
+            return RateLimiter(capacity=2, refill_rate=0.001)
+
+        def roomy():
+            return RateLimiter(capacity=1000, refill_rate=1000)
+
+        def login(email, headers=None):
+            return self.on_loop(self.client.post(
+                "/auth/login", json={"email": email, "senha": "errada"}, headers=headers or {}
+            ))
+
+        def limited(responses):
+            last = responses[-1]
+            return [r.status_code for r in responses] == [401, 401, 429] and last.headers.get("retry-after") is not None
+
+        with overridden(server, login_ip_limiter=small(), login_user_limiter=roomy()):
+            responses = [login(f"ip{i}@example.com") for i in range(3)]
+        self.log_test("Per-IP login bucket answers 429 with Retry-After", limited(responses),
+                      f"{[r.status_code for r in responses]}")
+
+        with overridden(server, login_ip_limiter=roomy(), login_user_limiter=small()):
+            responses = [login("mesmo@example.com") for _ in range(3)]
+            other = login("outro@example.com")
+        self.log_test("Per-email login bucket answers 429 with Retry-After",
+                      limited(responses) and other.status_code == 401,
+                      f"{[r.status_code for r in responses]}, other email {other.status_code}")
+
+        with overridden(server, login_ip_limiter=small(), login_user_limiter=roomy(), TRUST_PROXY_HEADERS=False):
+            responses = [login(f"xff{i}@example.com", {"X-Forwarded-For": f"198.51.100.{i}"}) for i in range(3)]
+        self.log_test("X-Forwarded-For is ignored by default", limited(responses),
+                      f"{[r.status_code for r in responses]}")
+
+        with overridden(server, login_ip_limiter=small(), login_user_limiter=roomy(), TRUST_PROXY_HEADERS=True):
+            rotated = [login(f"proxy{i}@example.com", {"X-Forwarded-For": f"198.51.100.{i}"}) for i in range(3)]
+            # Client-supplied hops on the left must not give a fresh bucket
+            spoofed = [login(f"spoof{i}@example.com", {"X-Forwarded-For": f"203.0.113.{i}, 192.0.2.7"}) for i in range(3)]
+        self.log_test("Trusted proxy: each forwarded client has its own bucket",
+                      all(r.status_code == 401 for r in rotated), f"{[r.status_code for r in rotated]}")
+        self.log_test("Trusted proxy: the right-most hop is the client address", limited(spoofed),
+                      f"{[r.status_code for r in spoofed]}")
+
+        limiter = ConcurrencyLimiter(max_concurrent=1, queue_timeout=0.05)
+        with overridden(server, heavy_route_limiter=limiter):
+            release = self.on_loop(limiter.acquire())
+            busy = self.on_loop(self.client.get("/dashboard/stats"))
+            release()
+            free = self.on_loop(self.client.get("/dashboard/stats"))
+        self.log_test(
+            "Concurrency limiter answers 503 after queue_timeout",
+            busy.status_code == 503 and busy.headers.get("retry-after") is not None and free.status_code == 200,
+            f"busy={busy.status_code}, free={free.status_code}",
+        )
+
+    def test_archiving(self):
+        """Soft deletes hide records, old vendas move to the archive with their carros, retention is honoured"""
+        import server
+        from archive import archive_old_vendas, archive_soft_deleted
+
+        print("\n🗄️ Testing archival and soft delete...")
+
+        def ids(path):
+            return {d["id"] for d in self.on_loop(self.client.get(path)).json()}
+
+        def set_fields(collection, doc_id, fields):
+            self.on_loop(server.db[collection].update_one({"id": doc_id}, {"$set": fields}))
+
+        def find(collection, doc_id):
+            return self.on_loop(server.db[collection].find_one({"id": doc_id}, {"_id": 0}))
+
+        def new_cliente(tag):
+            response = self.on_loop(self.client.post("/clientes", json={
+                "nome": f"Arquivo {tag}", "cpf": f"000.000.000-{tag}", "telefone": "(11) 90000-0000",
+                "email": f"arquivo{tag}@example.com", "endereco": "Rua do Arquivo, 1",
+            }))
+            response.raise_for_status()
+            return response.json()["id"]
+
+        cliente_id = new_cliente("01")
+        self.on_loop(self.client.delete(f"/clientes/{cliente_id}"))
+        self.log_test(
+            "Soft-deleted cliente is hidden from lists",
+            cliente_id not in ids("/clientes") and cliente_id not in ids("/clientes?incluir_arquivados=true")
+            and find("clientes", cliente_id)["deleted_at"] is not None,
+        )
+
+        old = self.new_venda()
+        resold = self.new_venda()
+        long_ago = (datetime.now(timezone.utc) - timedelta(days=30 * (server.ARCHIVE_AFTER_MONTHS + 1))).isoformat()
+        for venda in (old, resold):
+            set_fields("vendas", venda["id"], {"data_venda": long_ago})
+        # The second carro comes back in stock and is sold again today
+        set_fields("carros", resold["carro_id"], {"status": "disponivel"})
+        current = self.on_loop(self.client.post("/vendas", json={
+            "carro_id": resold["carro_id"], "cliente_id": resold["cliente_id"],
+            "funcionario_id": resold["funcionario_id"], "valor_venda": 71000.0,
+        })).json()
+        # Both carros stay referenced by archived vendas, so cleanup could not delete them
+        for venda in (old, resold):
+            self.created_ids['carros'].remove(venda["carro_id"])
+
+        moved = self.on_loop(archive_old_vendas(server.db, server.ARCHIVE_AFTER_MONTHS))
+        self.log_test(
+            "Old vendas and their sold carros move to the archive",
+            find("vendas", old["id"]) is None and find("vendas_archive", old["id"]) is not None
+            and find("carros", old["carro_id"]) is None and find("carros_archive", old["carro_id"]) is not None,
+            f"moved={moved}",
+        )
+        self.log_test(
+            "A carro resold after the cutoff stays in carros",
+            find("vendas_archive", resold["id"]) is not None and find("carros", resold["carro_id"]) is not None
+            and find("carros_archive", resold["carro_id"]) is None and find("vendas", current["id"]) is not None,
+        )
+        self.log_test(
+            "incluir_arquivados=true brings archived records back",
+            old["id"] not in ids("/vendas") and old["id"] in ids("/vendas?incluir_arquivados=true")
+            and old["carro_id"] not in ids("/carros") and old["carro_id"] in ids("/carros?incluir_arquivados=true"),
+        )
+
+        retention = server.SOFT_DELETE_RETENTION_DAYS
+        expired, kept = new_cliente("02"), new_cliente("03")
+        now = datetime.now(timezone.utc)
+        set_fields("clientes", expired, {"deleted_at": (now - timedelta(days=retention + 10)).isoformat()})
+        set_fields("clientes", kept, {"deleted_at": (now - timedelta(days=retention - 10)).isoformat()})
+        moved = self.on_loop(archive_soft_deleted(server.db, retention))
+        self.log_test(
+            "Soft-deleted records are archived only after SOFT_DELETE_RETENTION_DAYS",
+            find("clientes", expired) is None and find("clientes_archive", expired) is not None
+            and find("clientes", kept) is not None and find("clientes_archive", kept) is None,
+            f"moved={moved}",
+        )
+
+    def test_referential_integrity(self):
+        """restrict answers 409, cascade soft-deletes hot and archived vendas, the scanner reports orphans"""
+        import server
+
+        print("\n🔗 Testing referential integrity...")
+
+        def find(collection, doc_id):
+            return self.on_loop(server.db[collection].find_one({"id": doc_id}, {"_id": 0}))
+
+        def ranking_total(funcionario_id):
+            entry = self.on_loop(server.db.vendas_ranking.find_one({"periodo": "total", "funcionario_id": funcionario_id}))
+            return (entry["quantidade"], round(entry["receita"], 2)) if entry else (0, 0)
+
+        tag = uuid.uuid4().hex[:8]
+        funcionario = self.on_loop(self.client.post("/funcionarios", json={
+            "nome": f"Integridade {tag}", "cargo": "Vendedor", "email": f"integridade{tag}@example.com",
+            "salario": 3000.0, "senha": "senha123",
+        })).json()
+        hot = self.new_venda(funcionario_id=funcionario["id"], valor=60000.0)
+
+        with overridden(server, INTEGRITY_ON_DELETE="restrict"):
+            responses = {
+                "carro": self.on_loop(self.client.delete(f"/carros/{hot['carro_id']}")),
+                "cliente": self.on_loop(self.client.delete(f"/clientes/{hot['cliente_id']}")),
+                "funcionario": self.on_loop(self.client.delete(f"/funcionarios/{funcionario['id']}")),
+            }
+        self.log_test(
+            "restrict: deleting a referenced carro, cliente or funcionário answers 409",
+            all(r.status_code == 409 for r in responses.values())
+            and find("carros", hot["carro_id"]).get("deleted_at") is None
+            and find("funcionarios", funcionario["id"]).get("deleted_at") is None,
+            f"{ {name: r.status_code for name, r in responses.items()} }",
+        )
+
+        # A second venda lives in the archive, where cascade must reach it too
+        archived = self.new_venda(funcionario_id=funcionario["id"], valor=50000.0)
+        doc = self.on_loop(server.db.vendas.find_one({"id": archived["id"]}))
+        self.on_loop(server.db.vendas_archive.insert_one(doc))
+        self.on_loop(server.db.vendas.delete_one({"_id": doc["_id"]}))
+        before = ranking_total(funcionario["id"])
+
+        with overridden(server, INTEGRITY_ON_DELETE="cascade"):
+            deleted = self.on_loop(self.client.delete(f"/funcionarios/{funcionario['id']}"))
+            other = self.new_venda()
+            carro_deleted = self.on_loop(self.client.delete(f"/carros/{other['carro_id']}"))
+        self.created_ids['carros'].remove(other["carro_id"])
+
+        self.log_test(
+            "cascade: a deleted funcionário soft-deletes its hot and archived vendas",
+            deleted.status_code == 200
+            and find("vendas", hot["id"])["deleted_at"] is not None
+            and find("vendas_archive", archived["id"])["deleted_at"] is not None
+            and find("carros", hot["carro_id"])["status"] == "disponível",
+            f"status={deleted.status_code}",
+        )
+        after = ranking_total(funcionario["id"])
+        self.log_test("cascade: ranking is decremented for the cascaded vendas",
+                      before == (2, 110000.0) and after == (0, 0), f"before={before}, after={after}")
+        self.log_test(
+            "cascade: a deleted carro soft-deletes its venda and stays deleted",
+            carro_deleted.status_code == 200 and find("vendas", other["id"])["deleted_at"] is not None
+            and find("carros", other["carro_id"])["deleted_at"] is not None,
+            f"status={carro_deleted.status_code}",
+        )
+
+        carro = self.on_loop(self.client.get("/carros")).json()[0]
+        vendedor = self.on_loop(self.client.get("/funcionarios")).json()[0]
+        orphan = {
+            "id": str(uuid.uuid4()), "carro_id": carro["id"], "cliente_id": "cliente-inexistente",
+            "funcionario_id": vendedor["id"], "data_venda": datetime.now(timezone.utc).isoformat(),
+            "valor_venda": 1.0, "deleted_at": None,
+        }
+        self.on_loop(server.db.vendas.insert_one(orphan))
+        try:
+            report = self.on_loop(self.client.get("/admin/integrity?executar=true")).json()
+        finally:
+            self.on_loop(server.db.vendas.delete_one({"id": orphan["id"]}))
+        found = [o for o in report.get("orfas", []) if o["venda_id"] == orphan["id"]]
+        self.log_test(
+            "Integrity scan reports a planted orphan venda",
+            found == [{"venda_id": orphan["id"], "colecao": "vendas", "referencias_ausentes": ["cliente_id"]}],
+            f"total_orfas={report.get('total_orfas')}",
+        )
+
+    def test_ranking_aggregates(self):
+        """Creating and deleting a venda moves its month, year and total aggregates"""
+        import server
+        from leaderboard import periods_for
+
+        print("\n🏆 Testing ranking aggregates...")
+
+        def aggregates(funcionario_id, periodos):
+            async def read():
+                rows = await server.db.vendas_ranking.find(
+                    {"funcionario_id": funcionario_id, "periodo": {"$in": periodos}}, {"_id": 0}
+                ).to_list(None)
+                found = {r["periodo"]: (r["quantidade"], round(r["receita"], 2)) for r in rows}
+                return {p: found.get(p, (0, 0.0)) for p in periodos}
+            return self.on_loop(read())
+
+        funcionario_id = self.on_loop(self.client.get("/funcionarios")).json()[0]['id']
+        periodos = periods_for(datetime.now(timezone.utc).isoformat())
+        before = aggregates(funcionario_id, periodos)
+        venda = self.new_venda(funcionario_id=funcionario_id, valor=1234.5)
+        after_create = aggregates(funcionario_id, periodos)
+        expected = {p: (q + 1, round(r + 1234.5, 2)) for p, (q, r) in before.items()}
+        self.log_test(
+            "Venda creation increments month, year and total aggregates",
+            after_create == expected, f"before={before}, after={after_create}",
+        )
+
+        self.on_loop(self.client.delete(f"/vendas/{venda['id']}"))
+        after_delete = aggregates(funcionario_id, periodos)
+        self.log_test(
+            "Venda deletion decrements month, year and total aggregates",
+            after_delete == before,
+            f"before={before}, after={after_delete}",
+        )
+
+    def test_idempotency(self):
+        """Idempotency-Key: replay, concurrent duplicates, key reuse and takeover of an abandoned claim"""
+        import server
+
+        print("\n🔁 Testing Idempotency-Key...")
+        carro = {"modelo": "Idempotente", "marca": "Fiat", "cor": "Azul", "preco": 50000.0, "portas": 4}
+
+        def post(key, body=carro):
+            return self.client.post("/carros", json=body, headers={"Idempotency-Key": key})
+
+        key = f"replay-{uuid.uuid4()}"
+        first, second = self.on_loop(post(key)), self.on_loop(post(key))
+        self.created_ids['carros'].append(first.json()['id'])
+        self.log_test(
+            "Idempotent retry replays the stored response",
+            first.status_code == second.status_code == 200 and first.json() == second.json()
+            and second.headers.get("idempotent-replayed") == "true",
+            f"{first.status_code}/{second.status_code}, replayed={second.headers.get('idempotent-replayed')}",
+        )
+
+        mismatch = self.on_loop(post(key, {**carro, "preco": 1.0}))
+        self.log_test("Idempotency-Key reused with another body", mismatch.status_code == 422, f"Got {mismatch.status_code}")
+
+        async def concurrent():
+            key = f"concurrent-{uuid.uuid4()}"
+            return await asyncio.gather(*(post(key) for _ in range(5)))
+
+        responses = self.on_loop(concurrent())
+        ids = {r.json().get('id') for r in responses}
+        self.created_ids['carros'].extend(i for i in ids if i)
+        self.log_test(
+            "Concurrent duplicates create one record",
+            all(r.status_code == 200 for r in responses) and len(ids) == 1,
+            f"statuses={[r.status_code for r in responses]}, ids={len(ids)}",
+        )
+
+        # Simulate a worker killed mid-request: the claim never got a response and its lease ran out
+        key = f"abandoned-{uuid.uuid4()}"
+        original = self.on_loop(post(key))
+        self.created_ids['carros'].append(original.json()['id'])
+
+        async def abandon_latest_claim():
+            claims = server.db.idempotency
+            latest = (await claims.find({}).sort("created_at", -1).limit(1).to_list(1))[0]
+            await claims.update_one({"_id": latest["_id"]}, {"$set": {"response": None, "lease_expires_at": datetime(2000, 1, 1)}})
+
+        self.on_loop(abandon_latest_claim())
+        retry = self.on_loop(post(key))
+        if retry.status_code == 200:
+            self.created_ids['carros'].append(retry.json()['id'])
+        self.log_test(
+            "Retry takes over a claim with an expired lease",
+            retry.status_code == 200 and retry.headers.get("idempotent-replayed") is None,
+            f"Got {retry.status_code}",
+        )
+
+    def log_test(self, name, success, details=""):
+        with self._lock:
+            super().log_test(name, success, details)
+
+    def run_core_tests(self):
+        """Run the CRUD and dashboard scenarios concurrently, then the isolated ones one at a time"""
+        scenarios = [
+            self.test_dashboard_stats,
+            self.test_carros_crud,
+            self.test_clientes_crud,
+            self.test_funcionarios_crud,
+            self.test_vendas_crud,
+            self.test_idempotency,
+        ]
+        with ThreadPoolExecutor(max_workers=len(scenarios)) as pool:
+            for future in [pool.submit(scenario) for scenario in scenarios]:
+                future.result()
+
+        # These swap server-wide settings or assert exact counters, so nothing may run alongside them
+        for scenario in [
+            self.test_ranking_aggregates,
+            self.test_coalescing,
+            self.test_rate_limits,
+            self.test_archiving,
+            self.test_referential_integrity,
+        ]:
+            scenario()
+
+
+async def run(args):
+    async with AsyncExitStack() as stack:
+        mongo_url, read_preference = args.mongo_url, args.read_preference
+        if args.replica_set:
+            mongo_url = await stack.enter_async_context(local_replica_set(args.replica_set_port))
+            read_preference = read_preference or "secondaryPreferred"
+        client = await stack.enter_async_context(in_process_client(mongo_url=mongo_url, read_preference=read_preference))
+        tester = InProcessAPITester(client, asyncio.get_running_loop())
+        start = time.perf_counter()
+        success = await asyncio.get_running_loop().run_in_executor(None, tester.run_all_tests)
+        print(f"   Elapsed: {time.perf_counter() - start:.2f}s")
+        if read_preference:
+            print(f"   Read routing: {(await client.get('/admin/metrics')).json()['leituras']}")
+    return tester, success
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--mongo-url", help="use a real (throwaway) MongoDB instead of mongomock")
+    parser.add_argument("--replica-set", action="store_true", help="start a local replica set (needs mongod on PATH)")
+    parser.add_argument("--replica-set-port", type=int, default=27018)
+    parser.add_argument("--read-preference", help="READ_PREFERENCE for routed reads (default secondaryPreferred with --replica-set)")
+    parser.add_argument("--output", help="write results as JSON, like backend_test_results.json")
+    args = parser.parse_args()
+
+    tester, success = asyncio.run(run(args))
+
+    if args.output:
+        results = {
+            "timestamp": datetime.now().isoformat(),
+            "total_tests": tester.tests_run,
+            "passed_tests": tester.tests_passed,
+            "success_rate": f"{(tester.tests_passed/tester.tests_run*100):.1f}%",
+            "test_details": tester.test_results
+        }
+        with open(args.output, 'w') as f:
+            json.dump(results, f, indent=2)
+
+    return 0 if success else 1
+
+
+if __name__ == "__main__":
+    sys.exit(main())
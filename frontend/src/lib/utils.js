@@ -4,3 +4,18 @@ import { twMerge } from "tailwind-merge"
 export function cn(...inputs) {
   return twMerge(clsx(inputs));
 }
+
+// crypto.randomUUID only exists in secure contexts (HTTPS or localhost)
+export function newIdempotencyKey() {
+  if (window.crypto?.randomUUID) {
+    return window.crypto.randomUUID();
+  }
+  return `${Date.now().toString(36)}-${Math.random().toString(36).slice(2)}-${Math.random().toString(36).slice(2)}`;
+}
+
+// The backend stores 4xx answers under the key (except 401/409/429), so a
+// corrected resubmission needs a fresh key or it is rejected with 422
+export function isStoredClientError(error) {
+  const status = error.response?.status;
+  return status >= 400 && status < 500 && ![401, 409, 429].includes(status);
+}
@@ -1,6 +1,7 @@
 import React, { useState, useEffect } from 'react';
 import axios from 'axios';
 import { API } from '../App';
+import { isStoredClientError, newIdempotencyKey } from '@/lib/utils';
 import { Button } from '@/components/ui/button';
 import { Input } from '@/components/ui/input';
 import { Label } from '@/components/ui/label';
@@ -15,6 +16,8 @@ export default function Carros({ token }) {
   const [filteredCarros, setFilteredCarros] = useState([]);
   const [loading, setLoading] = useState(true);
   const [dialogOpen, setDialogOpen] = useState(false);
+  // Same key for retries of one submission, so the backend never creates it twice
+  const [idempotencyKey, setIdempotencyKey] = useState(newIdempotencyKey);
   const [editingCarro, setEditingCarro] = useState(null);
   const [searchTerm, setSearchTerm] = useState('');
   const [filterStatus, setFilterStatus] = useState('todos');
@@ -82,7 +85,7 @@ export default function Carros({ token }) {
         toast.success('Carro atualizado com sucesso!');
       } else {
         await axios.post(`${API}/carros`, formData, {
-          headers: { Authorization: `Bearer ${token}` },
+          headers: { Authorization: `Bearer ${token}`, 'Idempotency-Key': idempotencyKey },
         });
         toast.success('Carro cadastrado com sucesso!');
       }
@@ -92,6 +95,9 @@ export default function Carros({ token }) {
       fetchCarros();
     } catch (error) {
       toast.error(error.response?.data?.detail || 'Erro ao salvar carro');
+      if (isStoredClientError(error)) {
+        setIdempotencyKey(newIdempotencyKey());
+      }
     }
   };
 
@@ -124,6 +130,7 @@ export default function Carros({ token }) {
   const resetForm = () => {
     setFormData({ modelo: '', marca: '', cor: '', preco: '', portas: '4' });
     setEditingCarro(null);
+    setIdempotencyKey(newIdempotencyKey());
   };
 
   if (loading) {
@@ -1,6 +1,7 @@
 import React, { useState, useEffect } from 'react';
 import axios from 'axios';
 import { API } from '../App';
+import { isStoredClientError, newIdempotencyKey } from '@/lib/utils';
 import { Button } from '@/components/ui/button';
 import { Label } from '@/components/ui/label';
 import { Dialog, DialogContent, DialogHeader, DialogTitle, DialogTrigger } from '@/components/ui/dialog';
@@ -18,6 +19,8 @@ export default function Vendas({ token }) {
   const [funcionarios, setFuncionarios] = useState([]);
   const [loading, setLoading] = useState(true);
   const [dialogOpen, setDialogOpen] = useState(false);
+  // Same key for retries of one submission, so the backend never creates it twice
+  const [idempotencyKey, setIdempotencyKey] = useState(newIdempotencyKey);
 
   const [formData, setFormData] = useState({
     carro_id: '',
@@ -55,7 +58,7 @@ export default function Vendas({ token }) {
 
     try {
       await axios.post(`${API}/vendas`, formData, {
-        headers: { Authorization: `Bearer ${token}` },
+        headers: { Authorization: `Bearer ${token}`, 'Idempotency-Key': idempotencyKey },
       });
       toast.success('Venda registrada com sucesso!');
       setDialogOpen(false);
@@ -63,6 +66,9 @@ export default function Vendas({ token }) {
       fetchData();
     } catch (error) {
       toast.error(error.response?.data?.detail || 'Erro ao registrar venda');
+      if (isStoredClientError(error)) {
+        setIdempotencyKey(newIdempotencyKey());
+      }
     }
   };
 
@@ -82,6 +88,7 @@ export default function Vendas({ token }) {
 
   const resetForm = () => {
     setFormData({ carro_id: '', cliente_id: '', funcionario_id: '', valor_venda: '' });
+    setIdempotencyKey(newIdempotencyKey());
   };
 
   const getCarroInfo = (carroId) => {